@@ -48,3 +48,21 @@ export const fetchWithAuth = async (endpoint, options = {}) => {
 
     return response;
 };
+
+// Poll GET /jobs/{id} until a background job finishes. Returns null if it is
+// still running when we stop waiting (or can no longer be read)
+export const waitForJob = async (jobId, { intervalMs = 1000, timeoutMs = 30000 } = {}) => {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+        const response = await fetchWithAuth(`/jobs/${jobId}`);
+        if (!response.ok) {
+            return null;
+        }
+        const job = await response.json();
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            return job;
+        }
+        await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+    return null;
+};
@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useRef } from 'react'
 import { User, Mail, Edit2, LogOut, Moon, Sun, Bell, BellOff, Trash2, Info, Shield, Check, Coins, Target, ChevronRight, ChevronLeft, ChevronDown, X } from 'lucide-react'
 import { useNavigate } from 'react-router-dom'
-import { fetchWithAuth } from '../api' // Remove API_BASE_URL import if not used elsewhere, or keep if needed for constructing full URL in some edge case but fetchWithAuth handles it.
+import { fetchWithAuth, waitForJob } from '../api' // Remove API_BASE_URL import if not used elsewhere, or keep if needed for constructing full URL in some edge case but fetchWithAuth handles it.
 // Actually fetchWithAuth handles base URL.
 
 function ProfileDrawer({ isOpen, onClose }) {
@@ -709,7 +709,19 @@ function ProfileDrawer({ isOpen, onClose }) {
                                             // Clear AI chat history from local storage
                                             localStorage.removeItem('ai_chat_messages')
 
-                                            alert(data.message || 'All activity data has been deleted successfully!')
+                                            // The deletes run in the background; wait for them before reloading
+                                            const job = data.job_id ? await waitForJob(data.job_id) : null
+                                            if (data.job_id && !job) {
+                                                alert('Your data is still being deleted. Refresh the page in a minute to see the result.')
+                                                setIsDeleteConfirmOpen(false)
+                                                return
+                                            }
+                                            if (job && job.status === 'failed') {
+                                                alert('Failed to delete data. Please try again.')
+                                                return
+                                            }
+
+                                            alert('All activity data has been deleted. Your account and questionnaire answers remain intact.')
                                             setIsDeleteConfirmOpen(false)
                                             // Optionally refresh the page or update state
                                             window.location.reload()
@@ -1,5 +1,18 @@
+import asyncio
 import bcrypt
+import hashlib
+import os
 import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+# Work factor for new hashes. Existing hashes with a different cost are
+# transparently re-hashed on the user's next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt releases the GIL, so a few threads give real parallelism without
+# letting a login burst take over the default executor.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_password_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     # bcrypt.checkpw requires bytes
@@ -20,11 +33,28 @@ def get_password_hash(password: str) -> str:
     if isinstance(password, str):
         password = password.encode('utf-8')
         
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password, salt)
     return hashed.decode('utf-8')
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    # bcrypt hashes look like $2b$12$<salt+hash>; the second field is the cost
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the bcrypt thread pool so the event loop keeps serving requests."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
 import re
+from breached_passwords import is_breached_password
 
 def validate_password_strength(password: str, email: str = "") -> tuple[bool, str]:
     """
@@ -73,7 +103,15 @@ def validate_password_strength(password: str, email: str = "") -> tuple[bool, st
     if password.lower() in common_passwords:
         return False, "Password is too common."
 
+    # Leaked passwords (Bloom filter, so a tiny fraction of safe passwords may be rejected)
+    if is_breached_password(password):
+        return False, "This password has appeared in a data breach. Please choose a different one."
+
     return True, ""
 
 def generate_reset_token() -> str:
     return secrets.token_urlsafe(32)
+
+def hash_reset_token(token: str) -> str:
+    # Tokens are high-entropy random strings, so a plain SHA-256 is enough to store them safely
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
@@ -0,0 +1,92 @@
+"""
+Check the breached-password filter end to end: build a filter from a
+generated password list, look up members and non-members, then make sure
+damaged files (truncated, empty, header only, padded) are rejected by
+BloomFilter.open and that the runtime check falls back to skipping breach
+checks instead of raising. Exits non-zero on any failure.
+
+Runs in-process, no server or database needed:
+
+    python benchmarks/breached_filter.py --passwords 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import breached_passwords
+from breached_passwords import BloomFilter, build_filter
+
+
+def damaged_copies(path: str, workdir: str) -> dict:
+    with open(path, "rb") as f:
+        data = f.read()
+    header = breached_passwords._HEADER.size
+    variants = {
+        "truncated": data[:len(data) // 2],
+        "empty": b"",
+        "half header": data[:header // 2],
+        "header only": data[:header],
+        "padded": data + b"\0" * 16,
+    }
+    paths = {}
+    for name, content in variants.items():
+        paths[name] = os.path.join(workdir, name.replace(" ", "_") + ".bloom")
+        with open(paths[name], "wb") as f:
+            f.write(content)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--passwords", type=int, default=100_000)
+    parser.add_argument("--fp-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "passwords.txt")
+        with open(source, "w") as f:
+            f.writelines(f"leaked-{i}\n" for i in range(args.passwords))
+        path = os.path.join(workdir, "breached.bloom")
+        build_filter(source, path, args.fp_rate)
+
+        bloom = BloomFilter.open(path)
+        missing = sum(1 for i in range(args.passwords) if f"leaked-{i}" not in bloom)
+        start = time.perf_counter()
+        false_positives = sum(1 for i in range(args.passwords) if f"fresh-{i}" in bloom)
+        lookup_us = (time.perf_counter() - start) / args.passwords * 1e6
+        print(f"{args.passwords} passwords: {missing} members missed, "
+              f"FP rate {false_positives / args.passwords:.5f} (target {args.fp_rate}), {lookup_us:.2f} us per lookup")
+        if missing or false_positives / args.passwords > args.fp_rate * 3:
+            ok = False
+
+        for name, damaged in damaged_copies(path, workdir).items():
+            try:
+                BloomFilter.open(damaged)
+                print(f"FAIL: {name} file opened")
+                ok = False
+            except ValueError as e:
+                print(f"ok: {name} file rejected ({e})")
+
+            # The runtime check must degrade to "not breached", not fail signups
+            breached_passwords.BREACHED_PASSWORDS_FILTER = damaged
+            breached_passwords._filter = None
+            breached_passwords._filter_loaded = False
+            try:
+                if breached_passwords.is_breached_password("leaked-1"):
+                    print(f"FAIL: {name} file used for lookups")
+                    ok = False
+            except Exception as e:
+                print(f"FAIL: {name} file raised {type(e).__name__} at lookup: {e}")
+                ok = False
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the yearly calendar's wire formats: payload size (raw, gzip and,
+if the brotli package is installed, Brotli) and time to build and serialize
+one response.
+
+Runs in-process against synthetic logs, no server or database needed:
+
+    python benchmarks/calendar_payload.py --days 365 --smoke-rate 0.3
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from routes.calendar_router import build_calendar, build_compact_calendar
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def synthetic_logs(year: int, days: int, smoke_rate: float):
+    start = date(year, 1, 1)
+    logs = []
+    for i in range(days):
+        cigarettes = random.randint(1, 8) if random.random() < smoke_rate else 0
+        logs.append({"date": (start + timedelta(days=i)).strftime("%Y-%m-%d"), "cigarettes": cigarettes})
+    return logs
+
+
+def render(fmt: str, year: int, logs: list) -> bytes:
+    first_log_date = logs[0]["date"] if logs else None
+    if fmt == "full":
+        # What FastAPI does for response_model=CalendarResponse
+        return JSONResponse(jsonable_encoder(build_calendar(year, logs, first_log_date))).body
+    return JSONResponse(build_compact_calendar(year, logs, first_log_date, run_length=fmt == "rle")).body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", type=int, default=date.today().year - 1)
+    parser.add_argument("--days", type=int, default=365, help="days with a log entry")
+    parser.add_argument("--smoke-rate", type=float, default=0.3)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    random.seed(42)
+    logs = synthetic_logs(args.year, args.days, args.smoke_rate)
+
+    header = f"{'format':<8} {'raw':>9} {'gzip':>9}"
+    if brotli:
+        header += f" {'brotli':>9}"
+    print(header + f" {'build+serialize':>16}")
+
+    for fmt in ("full", "compact", "rle"):
+        body = render(fmt, args.year, logs)
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            render(fmt, args.year, logs)
+        per_call = (time.perf_counter() - start) / args.iterations
+
+        row = f"{fmt:<8} {len(body):>8}B {len(gzip.compress(body)):>8}B"
+        if brotli:
+            row += f" {len(brotli.compress(body)):>8}B"
+        print(row + f" {per_call * 1000:>13.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
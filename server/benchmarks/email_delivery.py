@@ -0,0 +1,81 @@
+"""
+Compare one-connection-per-message delivery with the pooled sender.
+
+Runs a local aiosmtpd sink (pip install aiosmtpd) with optional injected latency:
+
+    python benchmarks/email_delivery.py --messages 200 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def start_sink(port: int, latency: float):
+    from aiosmtpd.controller import Controller
+
+    class SlowSink:
+        received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            await asyncio.sleep(latency)
+            SlowSink.received += 1
+            return "250 Message accepted for delivery"
+
+    handler = SlowSink()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    return controller, handler
+
+
+def send_unpooled(port: int, count: int) -> float:
+    # Mirrors the previous implementation: connect, send one message, quit
+    start = time.perf_counter()
+    for i in range(count):
+        server = smtplib.SMTP("127.0.0.1", port)
+        server.sendmail("bench@respira.local", f"user{i}@example.com", "Subject: bench\n\nhello")
+        server.quit()
+    return time.perf_counter() - start
+
+
+async def send_pooled(count: int) -> float:
+    from email_utils import send_email, close_email_pool
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send_email(f"user{i}@example.com", "bench", "hello") for i in range(count)))
+    elapsed = time.perf_counter() - start
+    await close_email_pool()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    # Point the sender at the local sink before email_utils reads its config
+    os.environ["SMTP_SERVER"] = "127.0.0.1"
+    os.environ["SMTP_PORT"] = str(args.port)
+    os.environ["SMTP_USE_TLS"] = "false"
+    os.environ["SMTP_AUTH"] = "false"
+
+    controller, _ = start_sink(args.port, args.latency_ms / 1000)
+    try:
+        unpooled = send_unpooled(args.port, args.messages)
+        pooled = asyncio.run(send_pooled(args.messages))
+    finally:
+        controller.stop()
+
+    print(f"messages:  {args.messages}")
+    print(f"unpooled:  {unpooled:.2f}s ({args.messages / unpooled:.1f} msg/s)")
+    print(f"pooled:    {pooled:.2f}s ({args.messages / pooled:.1f} msg/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Check the gap-arithmetic lifetime streaks against the previous day-by-day
+walk on randomized histories, then time both at 10 years of logs.
+
+Runs in-process, no server or database needed:
+
+    python benchmarks/lifetime_stats.py --cases 2000 --years 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.calendar_router import compute_lifetime_stats
+
+
+def reference_lifetime_stats(logs: list) -> dict:
+    """The previous implementation: a set of smoked dates and a walk over every day."""
+    if not logs:
+        return {"current_streak": 0, "longest_streak": 0, "total_cigarettes": 0}
+
+    first_log_date = datetime.strptime(logs[0]["date"], "%Y-%m-%d").date()
+    today = datetime.now().date()
+
+    smoked_dates = set()
+    total_cigarettes = 0
+    for log in logs:
+        if log["cigarettes"] > 0:
+            smoked_dates.add(datetime.strptime(log["date"], "%Y-%m-%d").date())
+            total_cigarettes += log["cigarettes"]
+
+    longest_streak = 0
+    current_iter_streak = 0
+    end_date = today - timedelta(days=1)
+    d = first_log_date
+    while d <= end_date:
+        if d in smoked_dates:
+            current_iter_streak = 0
+        else:
+            current_iter_streak += 1
+            if current_iter_streak > longest_streak:
+                longest_streak = current_iter_streak
+        d += timedelta(days=1)
+
+    current_streak = current_iter_streak
+    if today in smoked_dates:
+        current_streak = 0
+
+    return {"current_streak": current_streak, "longest_streak": longest_streak, "total_cigarettes": total_cigarettes}
+
+
+def random_history(rng: random.Random) -> list:
+    """Sorted logs with gaps, duplicate dates, zero days, today and future dates mixed in."""
+    today = date.today()
+    span = rng.choice([0, 1, 2, 5, 30, 400])
+    start = today - timedelta(days=rng.randint(-3, span))
+    smoke_rate = rng.random()
+    logs = []
+    for _ in range(rng.randint(0, 60)):
+        day = start + timedelta(days=rng.randint(0, span + 3))
+        cigarettes = rng.randint(1, 10) if rng.random() < smoke_rate else 0
+        logs.append({"date": day.isoformat(), "cigarettes": cigarettes})
+    logs.sort(key=lambda log: log["date"])
+    return logs
+
+
+def ten_year_history(years: int, smoke_rate: float) -> list:
+    rng = random.Random(7)
+    start = date.today() - timedelta(days=365 * years)
+    return [
+        {"date": (start + timedelta(days=i)).isoformat(), "cigarettes": rng.randint(1, 8) if rng.random() < smoke_rate else 0}
+        for i in range(365 * years)
+    ]
+
+
+def time_per_call(fn, logs, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(logs)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    for case in range(args.cases):
+        logs = random_history(rng)
+        expected = reference_lifetime_stats(logs)
+        actual = compute_lifetime_stats(logs).model_dump()
+        if actual != expected:
+            raise SystemExit(f"Mismatch on case {case}: {actual} != {expected}\nlogs={logs}")
+    print(f"equivalence: {args.cases} randomized histories match")
+
+    for smoke_rate in (0.05, 0.5):
+        logs = ten_year_history(args.years, smoke_rate)
+        old = time_per_call(reference_lifetime_stats, logs, args.iterations)
+        new = time_per_call(compute_lifetime_stats, logs, args.iterations)
+        print(f"{args.years} years, {smoke_rate:.0%} smoked days: "
+              f"day walk {old * 1000:.2f} ms, gap arithmetic {new * 1000:.2f} ms ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Fire a burst of concurrent logins at a running server and measure how much
+they slow down an unrelated endpoint.
+
+Start the API first. Login is rate limited per IP (rate_limit.py), so lift
+the limit for the benchmark or most of the burst is answered with 429:
+
+    RATE_LIMITS='{"POST /auth/login": {"ip": "100000/minute", "global": "100000/minute"}}' uvicorn main:app
+
+then:
+
+    python benchmarks/login_concurrency.py --logins 200
+
+Rate-limited logins are counted and reported separately, not timed.
+
+Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+EMAIL = "bench-login@respira.local"
+PASSWORD = "Bench!Login42"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, samples: list, interval: float):
+    """Hit /health in a loop; its latency shows how blocked the event loop is."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/health")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def login(client: httpx.AsyncClient, latencies: list, rejected: list):
+    start = time.perf_counter()
+    resp = await client.post("/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    if resp.status_code == 429:
+        rejected.append(resp)
+        return
+    resp.raise_for_status()
+    latencies.append(time.perf_counter() - start)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.logins + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        await client.post("/auth/signup", json={"name": "Bench", "email": EMAIL, "password": PASSWORD})
+
+        # Idle baseline for the probe endpoint
+        idle, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, idle, args.probe_interval))
+        await asyncio.sleep(2)
+        stop.set()
+        await task
+
+        loaded, stop = [], asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, loaded, args.probe_interval))
+        logins, rejected = [], []
+        start = time.perf_counter()
+        await asyncio.gather(*(login(client, logins, rejected) for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+
+    print(f"logins:              {args.logins} in {elapsed:.2f}s ({args.logins / elapsed:.1f}/s)")
+    if rejected:
+        print(f"rate limited (429):  {len(rejected)} of {args.logins} - start the server with RATE_LIMITS to lift the login limit")
+    if logins:
+        print(f"login p50 / p99:     {statistics.median(logins) * 1000:.0f} / {percentile(logins, 99) * 1000:.0f} ms")
+    print(f"/health idle p50/99: {statistics.median(idle) * 1000:.1f} / {percentile(idle, 99) * 1000:.1f} ms")
+    print(f"/health load p50/99: {statistics.median(loaded) * 1000:.1f} / {percentile(loaded, 99) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--probe-interval", type=float, default=0.02)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Load harness for the daily notification pipeline.
+
+Seeds a local MongoDB with synthetic opted-in users and log histories, points the
+Groq client and SMTP at local stand-ins with injected latency, then runs one full
+notification cycle (due-queue pass + outbox drain) and reports throughput,
+per-user latency and peak memory.
+
+Needs a local mongod and aiosmtpd (pip install aiosmtpd):
+
+    python benchmarks/notification_load.py --users 10000 --logs-per-user 90 \\
+        --llm-latency-ms 300 --smtp-latency-ms 20
+
+The benchmark database is dropped afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TRIGGERS = ["Stress", "After meals", "Boredom", "Social", "Coffee", "Alcohol"]
+
+
+def start_llm_stub(port: int, latency: float) -> ThreadingHTTPServer:
+    """Minimal stand-in for the OpenAI-compatible chat completions endpoint."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "llama-3.1-8b-instant",
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "Your evenings are getting calmer, keep it up."}
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def seed(db, users: int, logs_per_user: int, batch: int = 1000):
+    now = datetime.now()
+    today = now.date()
+
+    user_docs, smoke_docs, urge_docs = [], [], []
+
+    async def flush(force=False):
+        for collection, docs in (("users", user_docs), ("smoke_logs", smoke_docs), ("urge_logs", urge_docs)):
+            if docs and (force or len(docs) >= batch):
+                await db[collection].insert_many(docs, ordered=False)
+                docs.clear()
+
+    for i in range(users):
+        email = f"bench{i}@respira.local"
+        user_docs.append({
+            "email": email,
+            "name": f"Bench {i}",
+            "auth_provider": "email",
+            "notifications_enabled": True,
+            "next_send_at": now - timedelta(minutes=1),
+            "smoke_free_goal": random.choice([7, 14, 30]),
+            "user_profile": {"summary": "Smokes 10 a day, mostly under stress."}
+        })
+        for d in range(logs_per_user):
+            smoke_docs.append({
+                "user_id": email,
+                "date": (today - timedelta(days=d)).strftime("%Y-%m-%d"),
+                "cigarettes": random.choice([0, 0, 1, 2, 3, 5]),
+                "triggers": random.sample(TRIGGERS, 2)
+            })
+        for _ in range(max(1, logs_per_user // 10)):
+            ts = now - timedelta(days=random.randint(0, max(1, logs_per_user)), hours=random.randint(0, 23))
+            urge_docs.append({"user_id": email, "trigger": random.choice(TRIGGERS), "timestamp": ts.isoformat()})
+        await flush()
+    await flush(force=True)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    import database
+    import notification_service
+    from email_outbox import outbox_worker
+    from email_utils import close_email_pool
+
+    db = database.get_database()
+    await db.client.drop_database(database.DATABASE_NAME)
+    await database.init_db()
+
+    print(f"Seeding {args.users} users x {args.logs_per_user} logs...")
+    t0 = time.perf_counter()
+    await seed(db, args.users, args.logs_per_user)
+    print(f"Seeded in {time.perf_counter() - t0:.1f}s")
+
+    # Time each user's insight + enqueue
+    latencies = []
+    notify_user = notification_service._notify_user
+
+    async def timed_notify_user(email):
+        start = time.perf_counter()
+        try:
+            await notify_user(email)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    notification_service._notify_user = timed_notify_user
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    processed = await notification_service.run_due_notifications()
+    cycle = time.perf_counter() - start
+
+    drain_start = time.perf_counter()
+    delivered = 0
+    while True:
+        count = await outbox_worker.run_once()
+        if not count:
+            break
+        delivered += count
+    drain = time.perf_counter() - drain_start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await close_email_pool()
+
+    if not args.keep:
+        await db.client.drop_database(database.DATABASE_NAME)
+
+    total = cycle + drain
+    print(f"users processed:     {processed}")
+    print(f"emails delivered:    {delivered}")
+    print(f"insight pass:        {cycle:.2f}s")
+    print(f"outbox drain:        {drain:.2f}s")
+    print(f"throughput:          {processed / total if total else 0:.1f} users/s")
+    if latencies:
+        print(f"per-user p50:        {statistics.median(latencies) * 1000:.1f} ms")
+        print(f"per-user p99:        {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"peak python memory:  {peak_traced / 1e6:.1f} MB (tracemalloc)")
+    print(f"peak process RSS:    {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--logs-per-user", type=int, default=60)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--smtp-latency-ms", type=float, default=20)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="respira_bench")
+    parser.add_argument("--llm-port", type=int, default=8090)
+    parser.add_argument("--smtp-port", type=int, default=8025)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded database")
+    args = parser.parse_args()
+
+    # Everything below is read at import time by the server modules
+    os.environ["MONGODB_URL"] = args.mongo_url
+    os.environ["DATABASE_NAME"] = args.database
+    os.environ["GROQ_API_KEY"] = "bench"
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.llm_port}"
+    os.environ["SMTP_SERVER"] = "127.0.0.1"
+    os.environ["SMTP_PORT"] = str(args.smtp_port)
+    os.environ["SMTP_USE_TLS"] = "false"
+    os.environ["SMTP_AUTH"] = "false"
+
+    from email_delivery import start_sink
+
+    llm = start_llm_stub(args.llm_port, args.llm_latency_ms / 1000)
+    smtp, _ = start_sink(args.smtp_port, args.smtp_latency_ms / 1000)
+    try:
+        asyncio.run(run(args))
+    finally:
+        smtp.stop()
+        llm.shutdown()
+
+
+if __name__ == "__main__":
+    main()
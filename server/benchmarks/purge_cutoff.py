@@ -0,0 +1,94 @@
+"""
+Check that the purge job's cutoff follows when documents were written, not
+their ids. Ids come from each app server's clock, so a document written
+before the delete request can carry a larger id than anything the request
+could have generated (and the other way round). Seeds both cases plus a
+legacy document without created_at, runs the purge twice (a retry) and
+exits non-zero if the wrong documents were deleted.
+
+Needs a local mongod:
+
+    python benchmarks/purge_cutoff.py
+
+The check database is dropped afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER = "purge-check@example.com"
+
+
+async def run(keep: bool) -> bool:
+    from bson import ObjectId
+    import database
+    from chat_history_writer import ChatHistoryWriter
+    from routes.user_router import _stamp_purge_request, purge_user_data
+
+    db = database.get_database()
+    await db.client.drop_database(database.DATABASE_NAME)
+    await db.users.insert_one({"email": USER})
+    writer = ChatHistoryWriter(batch_size=10, flush_interval=0)
+
+    async def chat(content: str, oid: ObjectId):
+        writer.enqueue({"_id": oid, "user_id": USER, "role": "user", "content": content, "timestamp": datetime.utcnow()})
+        await writer.flush()
+
+    # An id from a server whose clock runs an hour fast, written before the request
+    future_id = ObjectId.from_datetime(datetime.utcnow() + timedelta(hours=1))
+    await database.insert_stamped(db.urge_logs, {"_id": future_id, "user_id": USER, "trigger": "before"})
+    await chat("before", ObjectId.from_datetime(datetime.utcnow() + timedelta(hours=1)))
+    # Written before created_at was stamped at all
+    await db.smoke_logs.insert_one({"user_id": USER, "date": "2020-01-01", "cigarettes": 3})
+
+    requested_at = await _stamp_purge_request(db, USER)
+    # Stay clear of the cutoff's millisecond
+    await asyncio.sleep(0.01)
+
+    # An id from a server whose clock runs an hour slow, written after the request
+    past_id = ObjectId.from_datetime(datetime.utcnow() - timedelta(hours=1))
+    await database.insert_stamped(db.urge_logs, {"_id": past_id, "user_id": USER, "trigger": "after"})
+    await chat("after", ObjectId.from_datetime(datetime.utcnow() - timedelta(hours=1)))
+
+    async def report(done, total=None):
+        pass
+
+    payload = {"user_id": USER, "requested_at": requested_at}
+    await purge_user_data(payload, report)
+    await purge_user_data(payload, report)
+
+    urges = sorted(doc["trigger"] for doc in await db.urge_logs.find({"user_id": USER}).to_list(None))
+    chats = sorted(doc["content"] for doc in await db.chat_history.find({"user_id": USER}).to_list(None))
+    logs = await db.smoke_logs.count_documents({"user_id": USER})
+
+    ok = True
+    for name, got, expected in [("urge_logs", urges, ["after"]), ("chat_history", chats, ["after"]), ("smoke_logs", logs, 0)]:
+        status = "ok" if got == expected else "FAIL"
+        ok = ok and got == expected
+        print(f"{status}: {name} left {got}, expected {expected}")
+
+    if not keep:
+        await db.client.drop_database(database.DATABASE_NAME)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="respira_purge_check")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    os.environ["MONGODB_URL"] = args.mongo_url
+    os.environ["DATABASE_NAME"] = args.database
+
+    if not asyncio.run(run(args.keep)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Cost of RequestMetricsMiddleware on the hot path: drives a minimal ASGI app
+directly with and without the middleware and reports the added time per
+request, then how long rendering /metrics takes once many routes are known.
+
+Runs in-process, no server or database needed:
+
+    python benchmarks/request_metrics.py --requests 200000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_metrics import RequestMetrics, RequestMetricsMiddleware
+
+
+class FakeRoute:
+    def __init__(self, path: str):
+        self.path = path
+
+
+async def bare_app(scope, receive, send):
+    scope["route"] = scope["_route"]
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"status":"ok"}'})
+
+
+async def receive():
+    return {"type": "http.request", "body": b""}
+
+
+async def send(message):
+    pass
+
+
+async def drive(app, requests: int, routes: list) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        scope = {"type": "http", "method": "GET", "path": "/x", "_route": routes[i % len(routes)]}
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--routes", type=int, default=40)
+    args = parser.parse_args()
+
+    routes = [FakeRoute(f"/route_{i}/{{item_id}}") for i in range(args.routes)]
+    recorder = RequestMetrics()
+    instrumented = RequestMetricsMiddleware(bare_app, recorder=recorder)
+
+    bare = asyncio.run(drive(bare_app, args.requests, routes))
+    measured = asyncio.run(drive(instrumented, args.requests, routes))
+    print(f"{args.requests} requests over {args.routes} routes: "
+          f"bare {bare * 1e6:.2f} us, with middleware {measured * 1e6:.2f} us "
+          f"(+{(measured - bare) * 1e6:.2f} us per request)")
+
+    start = time.perf_counter()
+    text = recorder.render()
+    print(f"render: {len(text.splitlines())} lines in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
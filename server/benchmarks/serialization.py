@@ -0,0 +1,95 @@
+"""
+Per-endpoint serialization microbenchmark: FastAPI's default path
+(response_model validation + jsonable_encoder + json.dumps) against
+respond() (model_construct + orjson).
+
+Runs in-process against synthetic data, no server or database needed:
+
+    python benchmarks/serialization.py --iterations 500
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from models import CalendarResponse, LifetimeStats, UrgeStats
+from responses import respond
+from routes.calendar_router import build_calendar, compute_lifetime_stats
+from routes.insights_router import InsightGraph
+from routes.urge_router import compute_urge_stats
+
+
+def synthetic_data(days: int):
+    start = date.today() - timedelta(days=days)
+    smoke_logs, urge_logs = [], []
+    for i in range(days):
+        day = start + timedelta(days=i)
+        cigarettes = random.randint(1, 8) if random.random() < 0.3 else 0
+        smoke_logs.append({
+            "date": day.strftime("%Y-%m-%d"),
+            "cigarettes": cigarettes,
+            "triggers": random.sample(["Stress", "Coffee", "Alcohol", "Boredom", "Social"], 2)
+        })
+        if random.random() < 0.5:
+            urge_logs.append({
+                "trigger": random.choice(["Stress", "Coffee", "Boredom"]),
+                "timestamp": f"{day.isoformat()}T{random.randint(0, 23):02d}:00:00"
+            })
+    return smoke_logs, urge_logs
+
+
+def default_path(content, response_model=None) -> bytes:
+    # What FastAPI does with a returned object that isn't a Response
+    if response_model is not None:
+        content = response_model.model_validate(content).model_dump(mode="json")
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(42)
+    smoke_logs, urge_logs = synthetic_data(args.days)
+    year = date.today().year
+    year_logs = [log for log in smoke_logs if log["date"].startswith(f"{year}-")]
+    first_log_date = smoke_logs[0]["date"]
+
+    # Build each payload once; only serialization is timed
+    calendar = build_calendar(year, year_logs, first_log_date)
+    calendar_dict = calendar.model_dump()
+    lifetime = compute_lifetime_stats(smoke_logs)
+    insights = InsightGraph(smoke_logs, urge_logs, [], {"smoke_free_goal": 30}).build()
+    urge_stats = compute_urge_stats(urge_logs)
+
+    cases = [
+        ("calendar", lambda: default_path(calendar_dict, CalendarResponse), lambda: respond(calendar).body),
+        ("lifetime", lambda: default_path(lifetime.model_dump(), LifetimeStats), lambda: respond(lifetime).body),
+        ("insights", lambda: default_path(insights), lambda: respond(insights).body),
+        ("urge stats", lambda: default_path(urge_stats, UrgeStats), lambda: respond(urge_stats).body),
+    ]
+
+    print(f"{'endpoint':<12} {'default':>10} {'respond':>10} {'speedup':>8}")
+    for name, default_fn, fast_fn in cases:
+        default_time = time_per_call(default_fn, args.iterations)
+        fast_time = time_per_call(fast_fn, args.iterations)
+        print(f"{name:<12} {default_time * 1e6:>8.1f}us {fast_time * 1e6:>8.1f}us {default_time / fast_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Breached-password check backed by a memory-mapped Bloom filter.
+
+Build the filter once from a leaked-password list (one password per line):
+
+    python breached_passwords.py build passwords.txt breached_passwords.bloom --fp-rate 0.001
+
+At runtime the file is mmapped lazily on the first check. The mapping is
+read-only, so every worker process shares the same pages through the OS
+page cache instead of holding its own copy.
+"""
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+BREACHED_PASSWORDS_FILTER = os.getenv(
+    "BREACHED_PASSWORDS_FILTER",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "breached_passwords.bloom")
+)
+
+# magic, version, hash count (k), bit count (m), item count (n)
+_HEADER = struct.Struct("<8sIIQQ")
+_MAGIC = b"RSPBLOOM"
+_VERSION = 1
+
+
+def _hash_pair(password: str) -> tuple[int, int]:
+    digest = hashlib.blake2b(password.encode("utf-8"), digest_size=16).digest()
+    h1, h2 = struct.unpack("<QQ", digest)
+    # Odd step so the k probes never collapse onto one bit
+    return h1, h2 | 1
+
+
+def optimal_parameters(n: int, fp_rate: float) -> tuple[int, int]:
+    """Bit count and hash count for n items at the requested false-positive rate."""
+    n = max(1, n)
+    m = math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2))
+    k = max(1, round(m / n * math.log(2)))
+    return m, k
+
+
+class BloomFilter:
+    def __init__(self, bits, m: int, k: int, n: int):
+        self.bits = bits
+        self.m = m
+        self.k = k
+        self.n = n
+
+    def __contains__(self, password: str) -> bool:
+        h1, h2 = _hash_pair(password)
+        bits, m = self.bits, self.m
+        for i in range(self.k):
+            index = (h1 + i * h2) % m
+            if not bits[index >> 3] & (1 << (index & 7)):
+                return False
+        return True
+
+    @classmethod
+    def open(cls, path: str) -> "BloomFilter":
+        """Map a filter file. Raises ValueError if it isn't one or is truncated."""
+        with open(path, "rb") as f:
+            # mmap itself raises ValueError for an empty file
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(mapped) < _HEADER.size:
+                raise ValueError(f"{path} is too short to be a breached-password filter")
+            magic, version, k, m, n = _HEADER.unpack_from(mapped, 0)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{path} is not a breached-password filter")
+            expected = _HEADER.size + (m + 7) // 8
+            if m == 0 or k == 0 or len(mapped) != expected:
+                raise ValueError(f"{path} is corrupt: {len(mapped)} bytes, header says {expected}")
+        except Exception:
+            mapped.close()
+            raise
+        bits = memoryview(mapped)[_HEADER.size:]
+        return cls(bits, m, k, n)
+
+
+def _read_passwords(path: str):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            password = line.rstrip("\r\n")
+            if password:
+                yield password
+
+
+def build_filter(source_path: str, output_path: str, fp_rate: float = 0.001) -> BloomFilter:
+    """Compile a password list into a filter file (two streaming passes over the list)."""
+    n = sum(1 for _ in _read_passwords(source_path))
+    m, k = optimal_parameters(n, fp_rate)
+    bits = bytearray((m + 7) // 8)
+
+    for password in _read_passwords(source_path):
+        h1, h2 = _hash_pair(password)
+        for i in range(k):
+            index = (h1 + i * h2) % m
+            bits[index >> 3] |= 1 << (index & 7)
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, k, m, n))
+        f.write(bits)
+    # Atomic swap so running workers never map a half-written file
+    os.replace(tmp_path, output_path)
+    return BloomFilter(bits, m, k, n)
+
+
+_filter = None
+_filter_loaded = False
+
+
+def _get_filter():
+    global _filter, _filter_loaded
+    if not _filter_loaded:
+        _filter_loaded = True
+        if os.path.exists(BREACHED_PASSWORDS_FILTER):
+            try:
+                _filter = BloomFilter.open(BREACHED_PASSWORDS_FILTER)
+            except (OSError, ValueError, struct.error) as e:
+                print(f"WARNING: Could not load breached-password filter: {e}")
+        else:
+            print("WARNING: Breached-password filter not found; skipping breach checks.")
+    return _filter
+
+
+def is_breached_password(password: str) -> bool:
+    bloom = _get_filter()
+    return bloom is not None and password in bloom
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Breached-password Bloom filter tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="compile a password list into a filter file")
+    build.add_argument("source")
+    build.add_argument("output", nargs="?", default=BREACHED_PASSWORDS_FILTER)
+    build.add_argument("--fp-rate", type=float, default=0.001)
+
+    check = sub.add_parser("check", help="look up a password in a filter file")
+    check.add_argument("password")
+    check.add_argument("--filter", default=BREACHED_PASSWORDS_FILTER)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        bloom = build_filter(args.source, args.output, args.fp_rate)
+        print(f"Wrote {args.output}: {bloom.n} passwords, {bloom.m} bits "
+              f"({bloom.m / 8 / 1e6:.1f} MB), {bloom.k} hashes, target FP rate {args.fp_rate}")
+    else:
+        bloom = BloomFilter.open(args.filter)
+        print("breached" if args.password in bloom else "not found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import random
+import re
+
+from cache_utils import TTLCache
+import metrics
+
+# Opt-in: set CHAT_CACHE_ENABLED=true to serve repeated messages from memory
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "false").lower() == "true"
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "2048"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", "600"))
+# A shared key only starts serving hits once it holds this many different
+# replies, so repeated messages still get some variety. Keys scoped to one
+# user serve from the first reply: a single user rarely sends the same
+# message often enough to collect several.
+CHAT_CACHE_MIN_VARIANTS = int(os.getenv("CHAT_CACHE_MIN_VARIANTS", "3"))
+CHAT_CACHE_MAX_VARIANTS = int(os.getenv("CHAT_CACHE_MAX_VARIANTS", "5"))
+
+# Context fields that build_prompt puts in front of the model
+CONTEXT_FIELDS = [
+    'profile_summary', 'smoke_free_goal', 'current_smoke_free_days',
+    'current_streak', 'longest_streak', 'trend', 'reduction_percent',
+    'high_risk_time', 'top_triggers'
+]
+
+# Messages that refer back to the conversation depend on history,
+# which is not part of the key, so they are never cached.
+HISTORY_PATTERNS = [
+    r'\b(you said|you told|you mentioned|earlier|before|last time|previous|again)\b',
+    # A pronoun opening or closing the message points at an earlier turn
+    # ("that sounds hard", "how do I do that?"); mid-sentence "that" usually doesn't
+    r'^\s*(that|those|these|it)\b',
+    r'\b(that|those|these|it)\s*[?.!]*\s*$',
+    r'\b(what do you mean|why did you|as you|tell me more)\b'
+]
+
+_HISTORY_RE = re.compile('|'.join(HISTORY_PATTERNS), re.IGNORECASE)
+
+
+def normalize_message(message: str) -> str:
+    text = message.lower().strip()
+    text = re.sub(r"[^\w\s']", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def context_fingerprint(context: dict) -> str:
+    fields = {field: context.get(field) for field in CONTEXT_FIELDS}
+    raw = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def references_history(message: str) -> bool:
+    return _HISTORY_RE.search(message) is not None
+
+
+class ChatResponseCache:
+    """
+    Exact-repeat cache for chat replies keyed by (normalized message, context fingerprint).
+    Replies written from a user's recent conversation are also keyed by that user,
+    so only first-turn replies (same message and context, hence the same prompt)
+    are shared between users. Each key keeps a few distinct replies and serves a
+    random one that differs from the previous answer for the same key.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, min_variants: int, max_variants: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.min_variants = max(1, min_variants)
+        self.max_variants = max(self.min_variants, max_variants)
+        self.bypassed = 0
+
+    def key_for(self, message: str, context: dict, user_id: str, has_history: bool):
+        if references_history(message):
+            self.bypassed += 1
+            return None
+        normalized = normalize_message(message)
+        if not normalized:
+            self.bypassed += 1
+            return None
+        return (normalized, context_fingerprint(context), user_id if has_history else None)
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        user_scoped = key[2] is not None
+        if not user_scoped and len(entry["variants"]) < self.min_variants:
+            # Still collecting variety: count as a miss so the caller asks the model
+            self._cache.hits -= 1
+            self._cache.misses += 1
+            return None
+
+        choices = [v for v in entry["variants"] if v != entry["last"]] or entry["variants"]
+        response = random.choice(choices)
+        entry["last"] = response
+        return response
+
+    def add(self, key, response: str) -> None:
+        entry = self._cache.pop(key)
+        if entry is None:
+            entry = {"variants": [], "last": None}
+        if response not in entry["variants"]:
+            entry["variants"].append(response)
+            entry["variants"] = entry["variants"][-self.max_variants:]
+        entry["last"] = response
+        self._cache.set(key, entry)
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["bypassed"] = self.bypassed
+        stats["enabled"] = CHAT_CACHE_ENABLED
+        return stats
+
+
+chat_response_cache = ChatResponseCache(
+    maxsize=CHAT_CACHE_MAX_ENTRIES,
+    ttl=CHAT_CACHE_TTL_SECONDS,
+    min_variants=CHAT_CACHE_MIN_VARIANTS,
+    max_variants=CHAT_CACHE_MAX_VARIANTS,
+)
+
+metrics.register("chat_response_cache", chat_response_cache.stats)
@@ -0,0 +1,199 @@
+import asyncio
+import os
+from collections import defaultdict
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import get_database, stamped_insert
+import metrics
+
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "50"))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", "0.5"))
+CHAT_WRITE_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_MAX_ATTEMPTS", "5"))
+CHAT_WRITE_RETRY_BASE_SECONDS = float(os.getenv("CHAT_WRITE_RETRY_BASE_SECONDS", "1"))
+# Write error for an _id that is already stored (an earlier attempt got through)
+DUPLICATE_KEY_ERROR = 11000
+
+
+class ChatHistoryWriter:
+    """
+    Write-behind buffer for chat_history.
+    Messages are queued in memory and flushed with one bulk write per batch.
+    Until a message is flushed it is kept in a per-user overlay so the next
+    history read still sees it. Messages that fail to write are queued again
+    with backoff and dropped after CHAT_WRITE_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending = defaultdict(list)  # user_id -> docs not yet flushed
+        self._task = None
+        self._attempts = {}  # _id -> failed writes so far
+        self._retries = {}   # timer handle -> docs waiting to be queued again
+        self.flushed = 0
+        self.failed_batches = 0
+        self.dropped = 0
+
+    def enqueue(self, doc: dict) -> dict:
+        # Assign the id up front so overlay and database copies can be deduplicated
+        doc.setdefault("_id", ObjectId())
+        self._pending[doc["user_id"]].append(doc)
+        self._queue.put_nowait(doc)
+        return doc
+
+    def pending_for(self, user_id: str) -> list:
+        return list(self._pending.get(user_id, []))
+
+    def discard(self, user_id: str) -> None:
+        """Drop unflushed messages for a user (used when their data is deleted)."""
+        for doc in self._pending.pop(user_id, []):
+            doc["_discarded"] = True
+
+    async def recent_history(self, user_id: str, limit: int = 6) -> list:
+        """Last `limit` messages, oldest first, merging stored and pending messages."""
+        db = get_database()
+        docs = await db["chat_history"].find({"user_id": user_id}).sort("timestamp", -1).limit(limit).to_list(length=limit)
+        seen = {doc["_id"] for doc in docs}
+        docs.extend(doc for doc in self.pending_for(user_id) if doc["_id"] not in seen)
+        docs.sort(key=lambda x: x['timestamp'])
+        return docs[-limit:]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and write out everything still queued."""
+        if self._task is not None:
+            # The sentinel makes the flusher write its current batch and exit
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+        # Batches waiting out a backoff get one last try now
+        for handle, docs in list(self._retries.items()):
+            handle.cancel()
+            self._requeue(handle, docs)
+        await self.flush()
+
+    async def flush(self) -> None:
+        while not self._queue.empty():
+            batch = []
+            while not self._queue.empty() and len(batch) < self.batch_size:
+                doc = self._queue.get_nowait()
+                if doc is not None:
+                    batch.append(doc)
+            await self._write(batch)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            doc = await self._queue.get()
+            if doc is None:
+                return
+            batch = [doc]
+            stopping = False
+            # Give concurrent turns a moment to join the batch
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    doc = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if doc is None:
+                    stopping = True
+                    break
+                batch.append(doc)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: list):
+        batch = [doc for doc in batch if not doc.get("_discarded")]
+        if not batch:
+            return
+        db = get_database()
+        failed = []
+        try:
+            await db["chat_history"].bulk_write(
+                [UpdateOne(*stamped_insert(doc), upsert=True) for doc in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            # Unordered: every document without its own write error was inserted
+            failed_indexes = {
+                error["index"] for error in e.details.get("writeErrors", [])
+                if error.get("code") != DUPLICATE_KEY_ERROR
+            }
+            failed = [doc for i, doc in enumerate(batch) if i in failed_indexes]
+            if failed or e.details.get("writeConcernErrors"):
+                print(f"Error flushing chat history batch: {len(failed)} of {len(batch)} messages not written")
+        except Exception as e:
+            failed = batch
+            print(f"Error flushing chat history batch: {e}")
+
+        failed_ids = {doc["_id"] for doc in failed}
+        written = [doc for doc in batch if doc["_id"] not in failed_ids]
+        self.flushed += len(written)
+        self._forget(written)
+        if failed:
+            self.failed_batches += 1
+            self._schedule_retry(failed)
+
+    def _forget(self, docs: list):
+        """Take written (or abandoned) messages out of the overlay."""
+        ids = {doc["_id"] for doc in docs}
+        for doc_id in ids:
+            self._attempts.pop(doc_id, None)
+        for user_id in {doc["user_id"] for doc in docs}:
+            remaining = [d for d in self._pending.get(user_id, []) if d["_id"] not in ids]
+            if remaining:
+                self._pending[user_id] = remaining
+            else:
+                self._pending.pop(user_id, None)
+
+    def _schedule_retry(self, docs: list):
+        retry, give_up = [], []
+        for doc in docs:
+            attempts = self._attempts.get(doc["_id"], 0) + 1
+            self._attempts[doc["_id"]] = attempts
+            (give_up if attempts >= CHAT_WRITE_MAX_ATTEMPTS else retry).append(doc)
+        if give_up:
+            self.dropped += len(give_up)
+            print(f"ERROR: Dropping {len(give_up)} chat messages after {CHAT_WRITE_MAX_ATTEMPTS} failed writes")
+            self._forget(give_up)
+        if retry:
+            attempts = max(self._attempts[doc["_id"]] for doc in retry)
+            delay = CHAT_WRITE_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+            loop = asyncio.get_running_loop()
+            handle = loop.call_later(delay, lambda: self._requeue(handle, retry))
+            self._retries[handle] = retry
+
+    def _requeue(self, handle, docs: list):
+        self._retries.pop(handle, None)
+        for doc in docs:
+            if doc.get("_discarded"):
+                self._attempts.pop(doc["_id"], None)
+            else:
+                self._queue.put_nowait(doc)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "pending_users": len(self._pending),
+            "flushed": self.flushed,
+            "failed_batches": self.failed_batches,
+            "retrying": sum(len(docs) for docs in self._retries.values()),
+            "dropped": self.dropped,
+        }
+
+
+chat_history_writer = ChatHistoryWriter(
+    batch_size=CHAT_WRITE_BATCH_SIZE,
+    flush_interval=CHAT_WRITE_FLUSH_INTERVAL,
+)
+
+metrics.register("chat_history_writer", chat_history_writer.stats)
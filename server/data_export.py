@@ -0,0 +1,118 @@
+"""
+Streaming export of everything stored for one user.
+
+Each collection is read through its Motor cursor and written out record by
+record, so memory stays flat no matter how much history a user has. The
+generators only produce the next chunk when the response asks for it, so a
+slow client slows the cursor down instead of filling a buffer.
+"""
+import csv
+import io
+import zipfile
+from database import get_database
+from responses import dumps
+
+EXPORT_BATCH_SIZE = 500
+
+# Never exported: credentials, reset tokens and internal scheduling state
+USER_EXCLUDED_FIELDS = {
+    "_id": 0, "password_hash": 0, "reset_token": 0, "reset_token_expiry": 0, "next_send_at": 0,
+    "purge_requested_at": 0
+}
+
+# collection -> (sort field, CSV columns)
+EXPORT_COLLECTIONS = {
+    "smoke_logs": ("date", ["date", "cigarettes", "triggers"]),
+    "urge_logs": ("timestamp", ["timestamp", "trigger"]),
+    "game_sessions": ("timestamp", ["timestamp", "seconds_focused", "points_earned"]),
+    "chat_history": ("timestamp", ["timestamp", "role", "content"]),
+}
+
+
+async def _user_records(user_id: str):
+    db = get_database()
+    user = await db["users"].find_one({"email": user_id}, USER_EXCLUDED_FIELDS)
+    if user:
+        yield user
+
+
+async def _collection_records(user_id: str, collection: str):
+    db = get_database()
+    sort_field, _ = EXPORT_COLLECTIONS[collection]
+    cursor = db[collection].find(
+        {"user_id": user_id}, {"_id": 0, "user_id": 0}
+    ).sort(sort_field, 1).batch_size(EXPORT_BATCH_SIZE)
+    async for doc in cursor:
+        yield doc
+
+
+async def stream_ndjson(user_id: str):
+    """One {"collection": ..., "record": ...} JSON object per line."""
+    async for user in _user_records(user_id):
+        yield dumps({"collection": "users", "record": user}) + b"\n"
+    for collection in EXPORT_COLLECTIONS:
+        async for doc in _collection_records(user_id, collection):
+            yield dumps({"collection": collection, "record": doc}) + b"\n"
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Write-only sink for ZipFile that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _cell(value):
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode()
+    return "" if value is None else value
+
+
+async def stream_csv_zip(user_id: str):
+    """
+    A zip with profile.csv plus one CSV per collection.
+    The sink isn't seekable, so ZipFile writes each entry's sizes in a
+    trailing data descriptor and never needs to go back over what it has
+    already yielded.
+    """
+    sink = _ChunkBuffer()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("profile.csv", mode="w", force_zip64=True) as entry:
+            async for user in _user_records(user_id):
+                entry.write(_csv_rows([["field", "value"]] + [[key, _cell(value)] for key, value in user.items()]))
+        yield sink.drain()
+
+        for collection, (_, columns) in EXPORT_COLLECTIONS.items():
+            with archive.open(f"{collection}.csv", mode="w", force_zip64=True) as entry:
+                entry.write(_csv_rows([columns]))
+                rows = []
+                async for doc in _collection_records(user_id, collection):
+                    rows.append([_cell(doc.get(column)) for column in columns])
+                    if len(rows) >= EXPORT_BATCH_SIZE:
+                        entry.write(_csv_rows(rows))
+                        rows = []
+                        chunk = sink.drain()
+                        if chunk:
+                            yield chunk
+                entry.write(_csv_rows(rows))
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
+
+
+def _csv_rows(rows: list) -> bytes:
+    text = io.StringIO()
+    csv.writer(text).writerows(rows)
+    return text.getvalue().encode("utf-8")
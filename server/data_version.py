@@ -0,0 +1,43 @@
+import hashlib
+from datetime import datetime
+from fastapi import Depends, HTTPException, Request
+from database import get_database
+from oauth2 import get_current_user
+
+
+async def bump_data_version(user_id: str):
+    """Call after any write that changes what the user's read endpoints return."""
+    db = get_database()
+    await db["users"].update_one({"email": user_id}, {"$inc": {"data_version": 1}})
+
+
+async def get_data_version(user_id: str) -> int:
+    db = get_database()
+    # Read from Mongo, not the principal cache, so other workers' writes are seen immediately
+    user = await db["users"].find_one({"email": user_id}, {"data_version": 1, "_id": 0})
+    return (user or {}).get("data_version", 0)
+
+
+async def check_etag(request: Request, current_user: dict = Depends(get_current_user)) -> str:
+    """
+    Dependency for read endpoints. Returns the weak ETag for this user, request
+    and day, or answers 304 right away if the client already has it.
+    The date is part of the tag because "today" shifts statuses and streaks.
+    The user's _id is hashed in because versions start at 0 for every account,
+    so without it two users would share tags for the same URL.
+    """
+    version = await get_data_version(current_user["email"])
+    target = f'{current_user["_id"]}|{request.url.path}?{request.url.query}'
+    digest = hashlib.sha256(target.encode()).hexdigest()[:12]
+    etag = f'W/"{version}-{datetime.now().strftime("%Y%m%d")}-{digest}"'
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")]:
+        raise HTTPException(status_code=304, headers=etag_headers(etag))
+    return etag
+
+
+def etag_headers(etag: str) -> dict:
+    # no-cache: the browser may keep the response but must revalidate it each time.
+    # Vary: the same URL returns a different body for each bearer token.
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
@@ -1,11 +1,12 @@
 import os
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-DATABASE_NAME = "quit_smoke_db"
+DATABASE_NAME = os.getenv("DATABASE_NAME", "quit_smoke_db")
 
 client = AsyncIOMotorClient(MONGODB_URL)
 db = client[DATABASE_NAME]
@@ -13,6 +14,49 @@ db = client[DATABASE_NAME]
 def get_database():
     return db
 
+def stamped_insert(doc: dict) -> tuple:
+    """
+    (filter, update) for an upsert that inserts `doc` with created_at set by
+    the database server's clock, so every app server stamps against the same
+    clock (the purge job cuts off on it). If the _id is already stored the
+    upsert fails with a duplicate key error instead of re-stamping it.
+    """
+    fields = {key: value for key, value in doc.items() if key != "_id"}
+    return (
+        {"_id": doc["_id"], "created_at": {"$exists": False}},
+        {"$setOnInsert": fields, "$currentDate": {"created_at": True}}
+    )
+
+async def insert_stamped(collection, doc: dict):
+    """insert_one for activity documents; see stamped_insert."""
+    doc.setdefault("_id", ObjectId())
+    await collection.update_one(*stamped_insert(doc), upsert=True)
+    return doc["_id"]
+
 async def init_db():
     # Ensure email is unique for users
     await db.users.create_index("email", unique=True)
+    # Lets get_current_user check a user's auth_version from the index alone
+    await db.users.create_index([("email", 1), ("auth_version", 1)])
+    # Due queue for daily notifications (only opted-in users carry next_send_at)
+    await db.users.create_index("next_send_at", sparse=True)
+
+    # Per-user reads sorted by date/timestamp; _id breaks ties for keyset pagination
+    await db.smoke_logs.create_index([("user_id", 1), ("date", 1), ("_id", 1)])
+    await db.urge_logs.create_index([("user_id", 1), ("timestamp", 1), ("_id", 1)])
+    await db.game_sessions.create_index([("user_id", 1), ("timestamp", 1), ("_id", 1)])
+    await db.chat_history.create_index([("user_id", 1), ("timestamp", 1), ("_id", 1)])
+
+    # Password reset tokens: looked up by hash, expired by Mongo's TTL monitor
+    await db.password_resets.create_index("token_hash", unique=True)
+    await db.password_resets.create_index("email")
+    await db.password_resets.create_index("expires_at", expireAfterSeconds=0)
+
+    from email_outbox import init_outbox_indexes
+    await init_outbox_indexes(db)
+
+    from job_queue import init_job_indexes
+    await init_job_indexes(db)
+
+    from rate_limit import init_rate_limit_indexes
+    await init_rate_limit_indexes(db)
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo.errors import DuplicateKeyError
+from database import get_database
+from email_utils import send_email, email_configured
+import metrics
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BASE_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BASE_BACKOFF_SECONDS", "30"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+# A claimed message that isn't finished within this window is picked up again
+OUTBOX_CLAIM_SECONDS = 120
+# Delivered messages are kept for a day (with the body already redacted) and
+# dead ones for a week, then removed by TTL indexes
+OUTBOX_SENT_RETENTION_SECONDS = 86400
+OUTBOX_DEAD_RETENTION_SECONDS = 7 * 86400
+
+
+async def init_outbox_indexes(db):
+    await db.email_outbox.create_index("idempotency_key", unique=True)
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.email_outbox.create_index("sent_at", expireAfterSeconds=OUTBOX_SENT_RETENTION_SECONDS)
+    await db.email_outbox.create_index("dead_at", expireAfterSeconds=OUTBOX_DEAD_RETENTION_SECONDS)
+    # Messages carrying a short-lived secret are removed when it stops working, whatever their status
+    await db.email_outbox.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def enqueue_email(
+    to_email: str,
+    subject: str,
+    body: str,
+    idempotency_key: str,
+    kind: str = "generic",
+    expires_at: Optional[datetime] = None
+) -> bool:
+    """
+    Durably queue a message for delivery. Returns False if a message with the
+    same idempotency key was already queued (the call is then a no-op).
+    Pass `expires_at` when the body holds a secret (e.g. a reset token): the
+    message is never sent after it and the row is deleted at that time.
+    """
+    if not email_configured():
+        print("WARNING: SMTP_PASSWORD is None or empty.")
+        return False
+
+    db = get_database()
+    now = datetime.utcnow()
+    message = {
+        "idempotency_key": idempotency_key,
+        "kind": kind,
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    }
+    if expires_at is not None:
+        message["expires_at"] = expires_at
+    try:
+        await db["email_outbox"].insert_one(message)
+    except DuplicateKeyError:
+        return False
+
+    outbox_worker.wake()
+    return True
+
+
+class OutboxWorker:
+    """
+    Delivers queued email. Messages are claimed atomically, so any number of
+    workers (in one process or many) can drain the outbox without double sends.
+    Failed deliveries are retried with exponential backoff and moved to the
+    "dead" status after OUTBOX_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+        self.delivered = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim(self):
+        db = get_database()
+        now = datetime.utcnow()
+        return await db["email_outbox"].find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                # Claims abandoned by a crashed worker
+                {"status": "sending", "claimed_until": {"$lt": now}}
+            ]},
+            {"$set": {
+                "status": "sending",
+                "claimed_by": self.worker_id,
+                "claimed_until": now + timedelta(seconds=OUTBOX_CLAIM_SECONDS)
+            }},
+            sort=[("next_attempt_at", 1)]
+        )
+
+    async def _deliver(self, message: dict):
+        db = get_database()
+        expires_at = message.get("expires_at")
+        try:
+            if expires_at is not None and expires_at <= datetime.utcnow():
+                raise RuntimeError("Expired before it could be delivered")
+            await send_email(message["to"], message["subject"], message["body"])
+        except Exception as e:
+            attempts = message.get("attempts", 0) + 1
+            update = {"attempts": attempts, "last_error": str(e), "updated_at": datetime.utcnow()}
+            expired = expires_at is not None and expires_at <= datetime.utcnow()
+            if attempts >= OUTBOX_MAX_ATTEMPTS or expired:
+                update["status"] = "dead"
+                update["dead_at"] = datetime.utcnow()
+                self.dead_lettered += 1
+                print(f"ERROR: Giving up on {message['kind']} email to {message['to']}: {e}")
+            else:
+                update["status"] = "pending"
+                update["next_attempt_at"] = datetime.utcnow() + timedelta(
+                    seconds=OUTBOX_BASE_BACKOFF_SECONDS * (2 ** (attempts - 1))
+                )
+                self.retried += 1
+            await db["email_outbox"].update_one({"_id": message["_id"]}, {"$set": update})
+            return
+
+        now = datetime.utcnow()
+        await db["email_outbox"].update_one(
+            {"_id": message["_id"]},
+            # The body isn't needed once delivered, and may contain a secret
+            {"$set": {"status": "sent", "sent_at": now, "updated_at": now}, "$unset": {"claimed_until": "", "body": ""}}
+        )
+        self.delivered += 1
+
+    async def run_once(self) -> int:
+        """Claim and deliver one batch. Returns the number of messages processed."""
+        batch = []
+        while len(batch) < self.batch_size:
+            message = await self._claim()
+            if message is None:
+                break
+            batch.append(message)
+        if batch:
+            await asyncio.gather(*(self._deliver(message) for message in batch))
+        return len(batch)
+
+    async def _run(self):
+        while not self._stopping:
+            # Cleared before the pass so an enqueue during it triggers another pass
+            self._wakeup.clear()
+            processed = 0
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                print(f"Error in email outbox worker: {e}")
+            if processed or self._stopping:
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Let the in-flight batch finish so no message is left half-sent."""
+        if self._task is not None:
+            self._stopping = True
+            self.wake()
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+outbox_worker = OutboxWorker(batch_size=OUTBOX_BATCH_SIZE)
+
+metrics.register("email_outbox", outbox_worker.stats)
@@ -1,74 +1,203 @@
+import asyncio
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+import metrics
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+# Local sinks (e.g. aiosmtpd for benchmarks) don't need a login
+SMTP_AUTH = os.getenv("SMTP_AUTH", "true").lower() == "true"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+
+# Pool tuning
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.getenv("SMTP_MAX_MESSAGES_PER_SESSION", "100"))
+SMTP_SESSION_IDLE_SECONDS = float(os.getenv("SMTP_SESSION_IDLE_SECONDS", "60"))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "3"))
+SMTP_RETRY_BACKOFF = float(os.getenv("SMTP_RETRY_BACKOFF", "1.0"))
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
 # Default to the hardcoded one if not set, but user likely needs to override it
 DEFAULT_SENDER = "respira.health.app@gmail.com"
 
-def send_reset_email(to_email: str, reset_token: str):
-    # Read env vars here
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    sender_email = os.getenv("SENDER_EMAIL", DEFAULT_SENDER)
-    
-    print(f"DEBUG: Attempting to send email from {sender_email}")
-    if not smtp_password:
-        print("WARNING: SMTP_PASSWORD is None or empty.")
-        return
-    else:
-        print(f"DEBUG: SMTP_PASSWORD found (length: {len(smtp_password)})")
 
+def _is_transient(error: Exception) -> bool:
+    """Connection drops, timeouts and 4xx replies are worth retrying."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+
+class _Session:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPPool:
+    """
+    Keeps a few authenticated SMTP sessions open and sends through them from a
+    dedicated thread pool, so SMTP round trips never block the event loop.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="smtp")
+        self._idle: list[_Session] = []
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.connections_opened = 0
+
+    def _connect(self) -> _Session:
+        smtp = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_USE_TLS:
+            smtp.starttls()
+        if SMTP_AUTH:
+            sender_email = os.getenv("SENDER_EMAIL", DEFAULT_SENDER)
+            smtp.login(sender_email, os.getenv("SMTP_PASSWORD"))
+        self.connections_opened += 1
+        return _Session(smtp)
+
+    def _checkout(self) -> _Session:
+        with self._lock:
+            while self._idle:
+                session = self._idle.pop()
+                if time.monotonic() - session.last_used < SMTP_SESSION_IDLE_SECONDS:
+                    return session
+                # The server has probably dropped it by now
+                session.close()
+        return self._connect()
+
+    def _checkin(self, session: _Session):
+        session.last_used = time.monotonic()
+        if session.sent >= SMTP_MAX_MESSAGES_PER_SESSION:
+            session.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(session)
+                return
+        session.close()
+
+    def _send_blocking(self, sender_email: str, to_email: str, message: str):
+        session = self._checkout()
+        try:
+            session.smtp.sendmail(sender_email, to_email, message)
+        except Exception:
+            # Never hand a session in an unknown state back to the pool
+            session.close()
+            raise
+        session.sent += 1
+        self._checkin(session)
+
+    async def send(self, to_email: str, subject: str, body: str):
+        """Send one message, retrying transient failures with exponential backoff."""
+        sender_email = os.getenv("SENDER_EMAIL", DEFAULT_SENDER)
+
+        msg = MIMEMultipart()
+        msg['From'] = f"RESPIRA <{sender_email}>"
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        text = msg.as_string()
+
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            try:
+                await loop.run_in_executor(self._executor, self._send_blocking, sender_email, to_email, text)
+                self.sent += 1
+                return
+            except Exception as e:
+                if attempt >= SMTP_MAX_RETRIES or not _is_transient(e):
+                    self.failures += 1
+                    raise
+                self.retries += 1
+                await asyncio.sleep(SMTP_RETRY_BACKOFF * (2 ** attempt))
+                attempt += 1
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+    def stats(self) -> dict:
+        return {
+            "idle_sessions": len(self._idle),
+            "connections_opened": self.connections_opened,
+            "sent": self.sent,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+smtp_pool = SMTPPool(size=SMTP_POOL_SIZE)
+
+metrics.register("smtp_pool", smtp_pool.stats)
+
+
+def email_configured() -> bool:
+    if SMTP_AUTH and not os.getenv("SMTP_PASSWORD"):
+        return False
+    return True
+
+
+async def send_email(to_email: str, subject: str, body: str):
+    """Deliver a message through the shared pool. Raises if delivery fails."""
+    await smtp_pool.send(to_email, subject, body)
+
+
+async def close_email_pool():
+    await asyncio.get_running_loop().run_in_executor(None, smtp_pool.close)
+
+
+def build_reset_email(reset_token: str) -> tuple[str, str]:
     subject = "Reset Your Password - Respira"
-    
+
     # Simple body
     body = f"""
     Hello,
 
     You requested to reset your password for Respira.
-    
+
     Here is your reset token: {reset_token}
-    
+
     Use this token in the app to reset your password.
-    
+
     This link expires in 15 minutes.
-    
+
     Best,
     Respira Team
     """
+    return subject, body
 
-    msg = MIMEMultipart()
-    msg['From'] = f"RESPIRA <{sender_email}>"
-    msg['To'] = to_email
-    msg['Subject'] = subject
-
-    msg.attach(MIMEText(body, 'plain'))
-
-    try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        # Login with the sender email and the app password
-        server.login(sender_email, smtp_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, to_email, text)
-        server.quit()
-        print(f"SUCCESS: Email sent to {to_email}")
-    except Exception as e:
-        print(f"ERROR: Failed to send email: {e}")
-
-def send_daily_insight_email(to_email: str, insight_text: str):
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    sender_email = os.getenv("SENDER_EMAIL", DEFAULT_SENDER)
-    
-    if not smtp_password:
-        return
 
+def build_daily_insight_email(insight_text: str) -> tuple[str, str]:
     subject = "Today's Insight"
-    
+
     body = f"""
     Hello,
-    
+
     Here is your AI-powered insight for today:
 
     "{insight_text}"
@@ -78,21 +207,16 @@ def send_daily_insight_email(to_email: str, insight_text: str):
     Best,
     Respira Team
     """
+    return subject, body
 
-    msg = MIMEMultipart()
-    msg['From'] = f"RESPIRA <{sender_email}>"
-    msg['To'] = to_email
-    msg['Subject'] = subject
 
-    msg.attach(MIMEText(body, 'plain'))
+async def send_daily_insight_email(to_email: str, insight_text: str):
+    if not email_configured():
+        return
 
+    subject, body = build_daily_insight_email(insight_text)
     try:
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(sender_email, smtp_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, to_email, text)
-        server.quit()
+        await send_email(to_email, subject, body)
         print(f"SUCCESS: Daily insight email sent to {to_email}")
     except Exception as e:
         print(f"ERROR: Failed to send daily insight email: {e}")
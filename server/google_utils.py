@@ -1,18 +1,117 @@
-from google.oauth2 import id_token
-from google.auth.transport import requests
+import asyncio
+import re
+import time
+from typing import Callable
+from google.auth import jwt as google_jwt
+from google.auth import exceptions as google_exceptions
+import requests
 import os
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 
-def verify_google_token(token: str):
+# Google's signing keys as {key id: PEM certificate}
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+CERT_DEFAULT_MAX_AGE = 3600
+# Never hit the cert endpoint more often than this, even for unknown key ids
+CERT_MIN_REFRESH_SECONDS = 60
+CLOCK_SKEW_SECONDS = 10
+
+
+def fetch_google_certs() -> tuple[dict, float]:
+    """Default cert source: download Google's certs and honour Cache-Control max-age."""
+    resp = requests.get(GOOGLE_CERTS_URL, timeout=5)
+    resp.raise_for_status()
+    match = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+    max_age = float(match.group(1)) if match else CERT_DEFAULT_MAX_AGE
+    return resp.json(), max_age
+
+
+class GoogleCertCache:
+    """
+    In-process copy of Google's public keys so ID tokens are verified locally.
+    The source is any callable returning (certs, max_age_seconds); tests can
+    plug in a local key set.
+    """
+
+    def __init__(self, source: Callable[[], tuple[dict, float]] = fetch_google_certs):
+        self.source = source
+        self._certs = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = None
+        self._task = None
+
+    def set_source(self, source: Callable[[], tuple[dict, float]]):
+        self.source = source
+        self._certs = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+
+    async def refresh(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if self._certs and time.monotonic() - self._fetched_at < CERT_MIN_REFRESH_SECONDS:
+                return
+            certs, max_age = await asyncio.to_thread(self.source)
+            now = time.monotonic()
+            self._certs = certs
+            self._fetched_at = now
+            self._expires_at = now + max_age
+
+    async def get_certs(self, kid: str = None) -> dict:
+        stale = not self._certs or time.monotonic() >= self._expires_at
+        # An unknown key id usually means Google rotated keys before our copy expired
+        unknown_kid = kid is not None and kid not in self._certs
+        if stale or unknown_kid:
+            try:
+                await self.refresh()
+            except Exception as e:
+                if not self._certs:
+                    raise
+                # Keep verifying against the keys we have until the fetch recovers
+                print(f"Failed to refresh Google certs, using cached keys: {e}")
+        return self._certs
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+                # Refresh a little before the advertised expiry
+                delay = max(CERT_MIN_REFRESH_SECONDS, self._expires_at - time.monotonic() - 60)
+            except Exception as e:
+                print(f"Failed to refresh Google certs: {e}")
+                delay = CERT_MIN_REFRESH_SECONDS
+            await asyncio.sleep(delay)
+
+    def start(self):
+        """Keep the keys warm in the background so logins never wait on the fetch."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+
+google_cert_cache = GoogleCertCache()
+
+
+async def verify_google_token(token: str):
     if not GOOGLE_CLIENT_ID:
         # In a real scenario we might fail, but for dev we might log warning.
         # But verification requires client ID.
         raise ValueError("GOOGLE_CLIENT_ID not configured")
 
     try:
-        idinfo = id_token.verify_oauth2_token(token, requests.Request(), GOOGLE_CLIENT_ID)
-        
+        kid = google_jwt.decode_header(token).get("kid")
+        certs = await google_cert_cache.get_certs(kid)
+        # Signature check is CPU work; keep it off the event loop
+        idinfo = await asyncio.to_thread(
+            google_jwt.decode, token,
+            certs=certs, audience=GOOGLE_CLIENT_ID, clock_skew_in_seconds=CLOCK_SKEW_SECONDS
+        )
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+
         # ID token is valid. Get the user's Google Account ID from the decoded token.
         return {
             "sub": idinfo['sub'],
@@ -20,7 +119,7 @@ def verify_google_token(token: str):
             "name": idinfo.get('name', ''),
             "picture": idinfo.get('picture', '')
         }
-    except ValueError as e:
+    except (ValueError, google_exceptions.GoogleAuthError, requests.RequestException) as e:
         # Invalid token
         print(f"Google token verification failed: {e}")
         return None
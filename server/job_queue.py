@@ -0,0 +1,224 @@
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from database import get_database
+import metrics
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_BASE_BACKOFF_SECONDS = float(os.getenv("JOB_BASE_BACKOFF_SECONDS", "10"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+# A running job whose claim isn't renewed within this window is picked up again.
+# Progress reports renew the claim, so long jobs should report as they go.
+JOB_CLAIM_SECONDS = 300
+# Finished jobs stay queryable for a week, then are removed by a TTL index
+JOB_RETENTION_SECONDS = 7 * 86400
+
+# Handlers take (payload, report) and may return a small result dict.
+# They can run more than once for the same job, so they must be idempotent.
+JobHandler = Callable[[dict, Callable[..., Awaitable[None]]], Awaitable[Optional[dict]]]
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(job_type: str):
+    """Register the coroutine that runs jobs of `job_type`."""
+    def decorator(fn: JobHandler) -> JobHandler:
+        _handlers[job_type] = fn
+        return fn
+    return decorator
+
+
+async def init_job_indexes(db):
+    await db.jobs.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.jobs.create_index("finished_at", expireAfterSeconds=JOB_RETENTION_SECONDS)
+
+
+async def enqueue_job(job_type: str, payload: dict, user_id: str) -> str:
+    """Durably queue a job and return its id for GET /jobs/{id}."""
+    db = get_database()
+    now = datetime.utcnow()
+    result = await db["jobs"].insert_one({
+        "type": job_type,
+        "payload": payload,
+        "user_id": user_id,
+        "status": "queued",
+        "attempts": 0,
+        "progress": {"done": 0, "total": None},
+        "next_attempt_at": now,
+        "created_at": now,
+    })
+    job_worker.wake()
+    return str(result.inserted_id)
+
+
+async def get_job(job_id: str, user_id: str) -> Optional[dict]:
+    """The job if it exists and belongs to `user_id`, else None."""
+    try:
+        oid = ObjectId(job_id)
+    except (InvalidId, TypeError):
+        return None
+    db = get_database()
+    return await db["jobs"].find_one({"_id": oid, "user_id": user_id})
+
+
+class JobWorker:
+    """
+    Runs queued jobs in the background, at most `concurrency` at a time per
+    process. Jobs are claimed atomically, so every API worker can run one of
+    these against the same collection. Failed jobs are retried with
+    exponential backoff and marked "failed" after JOB_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+        self._running = set()
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim(self):
+        db = get_database()
+        now = datetime.utcnow()
+        # attempts counts starts, so a job that keeps crashing its worker still runs out
+        return await db["jobs"].find_one_and_update(
+            {"$or": [
+                {"status": "queued", "next_attempt_at": {"$lte": now}},
+                # Claims abandoned by a crashed worker
+                {"status": "running", "claimed_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "claimed_by": self.worker_id,
+                    "claimed_until": now + timedelta(seconds=JOB_CLAIM_SECONDS),
+                    "started_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _reporter(self, job: dict):
+        db = get_database()
+
+        async def report(done: int, total: Optional[int] = None):
+            await db["jobs"].update_one(
+                {"_id": job["_id"], "claimed_by": self.worker_id},
+                {"$set": {
+                    "progress": {"done": done, "total": total},
+                    "claimed_until": datetime.utcnow() + timedelta(seconds=JOB_CLAIM_SECONDS)
+                }}
+            )
+        return report
+
+    async def _execute(self, job: dict):
+        db = get_database()
+        handler = _handlers.get(job["type"])
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type {job['type']!r}")
+            if job["attempts"] > JOB_MAX_ATTEMPTS:
+                raise RuntimeError("Worker stopped responding on every attempt")
+            result = await handler(job["payload"], self._reporter(job))
+        except Exception as e:
+            attempts = job["attempts"]
+            update = {"last_error": str(e), "updated_at": datetime.utcnow()}
+            if handler is None or attempts >= JOB_MAX_ATTEMPTS:
+                update["status"] = "failed"
+                update["finished_at"] = datetime.utcnow()
+                self.failed += 1
+                print(f"ERROR: Job {job['_id']} ({job['type']}) failed after {attempts} attempts: {e}")
+            else:
+                update["status"] = "queued"
+                update["next_attempt_at"] = datetime.utcnow() + timedelta(
+                    seconds=JOB_BASE_BACKOFF_SECONDS * (2 ** (attempts - 1))
+                )
+                self.retried += 1
+            await db["jobs"].update_one(
+                {"_id": job["_id"], "claimed_by": self.worker_id},
+                {"$set": update, "$unset": {"claimed_until": ""}}
+            )
+            return
+
+        now = datetime.utcnow()
+        await db["jobs"].update_one(
+            {"_id": job["_id"], "claimed_by": self.worker_id},
+            {
+                "$set": {"status": "succeeded", "result": result, "finished_at": now, "updated_at": now},
+                "$unset": {"claimed_until": "", "last_error": ""}
+            }
+        )
+        self.succeeded += 1
+
+    def _job_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        # A slot freed up; claim the next job without waiting for the poll
+        self.wake()
+
+    async def _fill_slots(self) -> int:
+        started = 0
+        while len(self._running) < self.concurrency and not self._stopping:
+            job = await self._claim()
+            if job is None:
+                break
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._job_done)
+            started += 1
+        return started
+
+    async def _run(self):
+        while not self._stopping:
+            # Cleared before the pass so an enqueue during it triggers another pass
+            self._wakeup.clear()
+            try:
+                await self._fill_slots()
+            except Exception as e:
+                print(f"Error in job worker: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop claiming and let running jobs finish."""
+        if self._task is not None:
+            self._stopping = True
+            self.wake()
+            await self._task
+            self._task = None
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+job_worker = JobWorker(concurrency=JOB_CONCURRENCY)
+
+metrics.register("jobs", job_worker.stats)
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import get_database
+
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "15"))
+LEASE_HEARTBEAT_SECONDS = int(os.getenv("LEASE_HEARTBEAT_SECONDS", "5"))
+
+
+class LeaderLease:
+    """
+    Mongo-backed lease so that only one process runs a singleton background job.
+    The holder renews the lease every heartbeat; if it dies, the lease expires
+    and another process takes over on its next heartbeat.
+    """
+
+    def __init__(self, name: str, ttl: int = LEASE_TTL_SECONDS, heartbeat: int = LEASE_HEARTBEAT_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._job = None
+        self._loop_task = None
+
+    async def try_acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if we already hold it."""
+        db = get_database()
+        now = datetime.utcnow()
+        try:
+            lease = await db["leases"].find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": self.holder_id, "expires_at": now + timedelta(seconds=self.ttl), "renewed_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Someone else holds a live lease (the upsert collided with their document)
+            return False
+        return lease is not None and lease.get("holder") == self.holder_id
+
+    async def release(self):
+        db = get_database()
+        await db["leases"].delete_one({"_id": self.name, "holder": self.holder_id})
+        self.is_leader = False
+
+    async def _run(self, job_factory):
+        while True:
+            try:
+                self.is_leader = await self.try_acquire()
+            except Exception as e:
+                # If we can't reach Mongo we can't prove we still own the lease
+                print(f"Error renewing lease {self.name}: {e}")
+                self.is_leader = False
+
+            if self.is_leader and (self._job is None or self._job.done()):
+                print(f"[Lease] {self.holder_id} is now running {self.name}")
+                self._job = asyncio.create_task(job_factory())
+            elif not self.is_leader and self._job is not None:
+                print(f"[Lease] {self.holder_id} lost {self.name}, stopping job")
+                self._job.cancel()
+                self._job = None
+
+            await asyncio.sleep(self.heartbeat)
+
+    def start(self, job_factory):
+        """Run job_factory() in this process only while we hold the lease."""
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run(job_factory))
+
+    async def stop(self):
+        for task in (self._loop_task, self._job):
+            if task is not None:
+                task.cancel()
+        self._loop_task = None
+        self._job = None
+        if self.is_leader:
+            # Hand over immediately instead of waiting for expiry
+            await self.release()
+
+    def stats(self) -> dict:
+        return {"is_leader": int(self.is_leader)}
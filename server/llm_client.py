@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import metrics
+
+LLM_MODEL = "llama-3.1-8b-instant"
+# How many Groq calls may be in flight at once, how many requests may wait
+# for a slot, and for how long before they are shed with a degraded reply.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("LLM_MAX_QUEUE_WAIT_SECONDS", "2.0"))
+
+
+class LLMOverloaded(Exception):
+    """Raised when a request is shed instead of queued for an LLM slot."""
+
+
+class AdmissionGate:
+    """
+    Bounded concurrency with a short, bounded wait queue.
+    Interactive callers are shed when the queue is full or their wait runs out;
+    background callers (shed=False) just wait their turn.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_wait: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self, shed: bool = True):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        if shed and self.waiting >= self.max_queue:
+            self.shed += 1
+            raise LLMOverloaded("LLM wait queue is full")
+
+        start = time.monotonic()
+        acquired = admitted = False
+        self.waiting += 1
+        try:
+            if shed:
+                # wait_for can time out after the acquire already won a permit and
+                # drop it; asyncio.timeout cancels the acquire in place instead
+                async with asyncio.timeout(self.max_wait):
+                    await self._semaphore.acquire()
+                    acquired = True
+            else:
+                await self._semaphore.acquire()
+                acquired = True
+            admitted = True
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise LLMOverloaded("Timed out waiting for an LLM slot")
+        finally:
+            self.waiting -= 1
+            # A permit granted just as the wait was abandoned goes straight back
+            if acquired and not admitted:
+                self._semaphore.release()
+
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_observed_wait = max(self.max_observed_wait, waited)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_seconds": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+            "max_wait_seconds": round(self.max_observed_wait, 4),
+        }
+
+
+llm_gate = AdmissionGate(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_MAX_QUEUE_WAIT_SECONDS)
+metrics.register("llm_gate", llm_gate.stats)
+
+# The Groq SDK is synchronous; calls run here so they don't block the event loop
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+_clients = {}
+
+
+def get_groq_client():
+    """Shared Groq client for the configured API key, or None if no key is set."""
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        return None
+    if api_key not in _clients:
+        from groq import Groq
+        _clients[api_key] = Groq(api_key=api_key)
+    return _clients[api_key]
+
+
+async def create_chat_completion(client, shed: bool = True, **kwargs):
+    """
+    Run client.chat.completions.create behind the admission gate.
+    Raises LLMOverloaded if the request is shed.
+    """
+    kwargs.setdefault("model", LLM_MODEL)
+    async with llm_gate.slot(shed=shed):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_llm_executor, lambda: client.chat.completions.create(**kwargs))
@@ -1,10 +1,13 @@
 from dotenv import load_dotenv
+import hmac
 import os
 
 # Explicitly load .env from the server directory
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
 from routes import (
     calendar_router, 
@@ -15,18 +18,45 @@ from routes import (
     user_router,
     chat_router,
     auth_router,
+    dashboard_router,
+    jobs_router,
 )
 from database import init_db
+from responses import FastJSONResponse, respond
+import metrics
 
-app = FastAPI(title="Respira API")
+app = FastAPI(title="Respira API", default_response_class=FastJSONResponse)
 
-from notification_service import start_notification_service
+from notification_service import start_notification_service, stop_notification_service
+from chat_history_writer import chat_history_writer
+from email_utils import close_email_pool
+from email_outbox import outbox_worker
+from job_queue import job_worker
+from google_utils import google_cert_cache
+from rate_limit import RateLimitMiddleware
+from request_metrics import RequestMetricsMiddleware, request_metrics
 
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    chat_history_writer.start()
+    outbox_worker.start()
+    job_worker.start()
+    google_cert_cache.start()
     start_notification_service()
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_notification_service()
+    # Drain buffered chat messages, in-flight email and running jobs before the process exits
+    await chat_history_writer.stop()
+    await outbox_worker.stop()
+    await job_worker.stop()
+    await close_email_pool()
+
+# Throttle auth and LLM-backed routes (added before CORS so 429s still carry CORS headers)
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS for the React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -39,6 +69,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses; Brotli when brotli-asgi is installed (it falls back to gzip for older clients)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=1000)
+except ImportError:
+    from fastapi.middleware.gzip import GZipMiddleware
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Outermost, so it also times rejected requests and sees the compressed body size
+app.add_middleware(RequestMetricsMiddleware)
+
 # Standardized Routing with Prefixes
 app.include_router(auth_router.router, prefix="/auth", tags=["Auth"])
 app.include_router(calendar_router.router, prefix="/calendar", tags=["Calendar"])
@@ -48,10 +89,38 @@ app.include_router(game_router.router, prefix="/game", tags=["Game"])
 app.include_router(insights_router.router, prefix="/insights", tags=["Insights"])
 app.include_router(user_router.router, prefix="/user", tags=["User"])
 app.include_router(chat_router.router, prefix="/chat", tags=["Chat"])
+app.include_router(dashboard_router.router, prefix="/dashboard", tags=["Dashboard"])
+app.include_router(jobs_router.router, prefix="/jobs", tags=["Jobs"])
+
+# /stats and /metrics expose internals. With STATS_TOKEN set they require it as a
+# bearer token; without it they only answer requests made on the server itself.
+STATS_TOKEN = os.getenv("STATS_TOKEN")
+
+def require_stats_access(request: Request):
+    if STATS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), STATS_TOKEN.encode()):
+            return
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    # A local reverse proxy also connects from loopback, but adds X-Forwarded-For
+    host = request.client.host if request.client else None
+    if host in ("127.0.0.1", "::1") and "x-forwarded-for" not in request.headers:
+        return
+    raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/stats", dependencies=[Depends(require_stats_access)])
+async def runtime_stats():
+    # Hit ratios and counters registered by in-process caches and queues
+    return respond(metrics.collect())
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_stats_access)])
+async def prometheus_metrics():
+    # Request histograms for this worker process plus everything /stats reports
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": "now"}
+    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 @app.get("/")
 async def root():
@@ -0,0 +1,19 @@
+from typing import Callable, Dict
+
+# Components (caches, queues, gates...) register a callable returning a flat
+# dict of numbers. The values are collected on demand by the stats endpoint.
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    _providers[name] = provider
+
+
+def collect() -> dict:
+    snapshot = {}
+    for name, provider in _providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            print(f"Error collecting stats for {name}: {e}")
+    return snapshot
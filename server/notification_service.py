@@ -1,9 +1,29 @@
 import asyncio
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import os
+import zlib
 from database import get_database
-from email_utils import send_daily_insight_email
+from email_utils import build_daily_insight_email
+from email_outbox import enqueue_email
 from context_utils import get_user_context
+from leader_lease import LeaderLease
+from llm_client import get_groq_client, create_chat_completion
+import metrics
+
+# Daily send window: users are spread over NOTIFICATION_WINDOW_MINUTES starting at NOTIFICATION_HOUR
+NOTIFICATION_HOUR = int(os.getenv("NOTIFICATION_HOUR", "8"))
+NOTIFICATION_WINDOW_MINUTES = int(os.getenv("NOTIFICATION_WINDOW_MINUTES", "120"))
+NOTIFICATION_CONCURRENCY = int(os.getenv("NOTIFICATION_CONCURRENCY", "4"))
+# How long a claimed user is hidden from other passes while being processed
+NOTIFICATION_CLAIM_SECONDS = 600
+# Longest the scheduler sleeps between passes. Schedule changes made on other
+# workers are only noticed by the next pass, so this bounds how late they are.
+NOTIFICATION_POLL_SECONDS = float(os.getenv("NOTIFICATION_POLL_SECONDS", "60"))
+
+_schedule_changed = None
+
+notification_lease = LeaderLease("daily_notifications")
+metrics.register("notification_lease", notification_lease.stats)
 
 # We need a way to generate insights outside of the HTTP request context
 # I'll create a helper here that mimics the chat_router logic
@@ -23,12 +43,11 @@ async def generate_insight_for_user(user_id: str):
         if not has_logs and not has_profile:
             return "Start logging to unlock personalized insights!"
 
-        from groq import Groq
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             return "Keep tracking your progress—every log counts!"
             
-        client = Groq(api_key=api_key)
+        client = get_groq_client()
         
         # Decide focus
         import random
@@ -57,12 +76,14 @@ Money: ${context['money_spent']} spent.
 RULES: MAX 20 WORDS. EXACTLY 1 SHORT SENTENCE. Professional and soft tone.
 Insight:"""
 
-        chat_completion = client.chat.completions.create(
+        # Background job: wait for an LLM slot rather than being shed
+        chat_completion = await create_chat_completion(
+            client,
+            shed=False,
             messages=[
                 {"role": "system", "content": "You are a concise wellness assistant."},
                 {"role": "user", "content": prompt}
             ],
-            model="llama-3.1-8b-instant",
             temperature=0.8,
             max_tokens=50
         )
@@ -73,47 +94,159 @@ Insight:"""
         print(f"Error generating insight for {user_id}: {e}")
         return "Keep tracking your progress—every log counts toward your smoke-free goals!"
 
+def compute_next_send_at(email: str, after: datetime) -> datetime:
+    """
+    Next daily send slot for a user strictly after `after`.
+    Each user gets a stable offset inside the send window so deliveries are
+    spread out instead of all landing on the same minute.
+    """
+    offset_minutes = zlib.crc32(email.encode("utf-8")) % max(1, NOTIFICATION_WINDOW_MINUTES)
+    slot = datetime.combine(after.date(), time(hour=NOTIFICATION_HOUR)) + timedelta(minutes=offset_minutes)
+    if slot <= after:
+        slot += timedelta(days=1)
+    return slot
+
+def _schedule_event() -> asyncio.Event:
+    global _schedule_changed
+    if _schedule_changed is None:
+        _schedule_changed = asyncio.Event()
+    return _schedule_changed
+
+async def update_notification_schedule(email: str, enabled: bool):
+    """
+    Keep next_send_at in sync with the user's notification preference.
+    Users who haven't had today's insight yet become due immediately.
+    """
+    db = get_database()
+    users_collection = db["users"]
+
+    if not enabled:
+        await users_collection.update_one({"email": email}, {"$unset": {"next_send_at": ""}})
+        return
+
+    now = datetime.now()
+    user = await users_collection.find_one({"email": email}, {"last_notification_sent_at": 1})
+    already_sent_today = user and user.get("last_notification_sent_at") == now.strftime("%Y-%m-%d")
+    next_send_at = compute_next_send_at(email, now) if already_sent_today else now
+
+    await users_collection.update_one({"email": email}, {"$set": {"next_send_at": next_send_at}})
+    # Only reaches the scheduler if it runs in this process; otherwise the
+    # leader picks the change up on its next poll
+    _schedule_event().set()
+
+async def ensure_notification_schedule():
+    """
+    Backfill next_send_at for opted-in users created before the due queue existed.
+    """
+    db = get_database()
+    await db["users"].update_many(
+        {"notifications_enabled": True, "next_send_at": {"$exists": False}},
+        {"$set": {"next_send_at": datetime.now()}}
+    )
+
+async def _claim_due_user():
+    """
+    Atomically take one due user off the queue. The claim pushes next_send_at
+    forward by a lease, so a crash mid-send only delays that user's retry.
+    """
+    db = get_database()
+    now = datetime.now()
+    return await db["users"].find_one_and_update(
+        {"notifications_enabled": True, "next_send_at": {"$lte": now}},
+        {"$set": {"next_send_at": now + timedelta(seconds=NOTIFICATION_CLAIM_SECONDS)}},
+        sort=[("next_send_at", 1)],
+        projection={"email": 1}
+    )
+
+async def _notify_user(email: str):
+    db = get_database()
+    now = datetime.now()
+
+    print(f"Sending daily notification to {email}...")
+    insight = await generate_insight_for_user(email)
+    subject, body = build_daily_insight_email(insight)
+    # One insight per user per day, even if this user is claimed twice
+    await enqueue_email(
+        email, subject, body,
+        idempotency_key=f"daily-insight:{email}:{now.strftime('%Y-%m-%d')}",
+        kind="daily_insight"
+    )
+
+    # Update last sent date and schedule tomorrow's slot
+    await db["users"].update_one(
+        {"email": email},
+        {"$set": {
+            "last_notification_sent_at": now.strftime("%Y-%m-%d"),
+            "next_send_at": compute_next_send_at(email, now)
+        }}
+    )
+
+async def run_due_notifications() -> int:
+    """
+    Send to every user whose next_send_at has passed. Returns how many were processed.
+    """
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while True:
+            user = await _claim_due_user()
+            if user is None:
+                return
+            try:
+                await _notify_user(user["email"])
+                sent += 1
+            except Exception as e:
+                print(f"Error sending notification to {user['email']}: {e}")
+
+    await asyncio.gather(*(worker() for _ in range(NOTIFICATION_CONCURRENCY)))
+    return sent
+
+async def _seconds_until_next_due() -> float:
+    db = get_database()
+    next_user = await db["users"].find_one(
+        {"notifications_enabled": True, "next_send_at": {"$exists": True}},
+        projection={"next_send_at": 1},
+        sort=[("next_send_at", 1)]
+    )
+    if not next_user:
+        return NOTIFICATION_POLL_SECONDS
+    delay = (next_user["next_send_at"] - datetime.now()).total_seconds()
+    return min(max(0.0, delay), NOTIFICATION_POLL_SECONDS)
+
 async def send_daily_notifications():
     """
-    Background task that runs once a day to send insights.
+    Background task that sends insights as users become due.
+    Each pass only touches due users (indexed on next_send_at), then sleeps
+    until the earliest upcoming slot, at most NOTIFICATION_POLL_SECONDS.
+    Runs on the lease holder only, so schedule changes handled by other
+    workers are found by polling; the event only wakes it early for changes
+    made in this process.
     """
+    await ensure_notification_schedule()
+    event = _schedule_event()
+
     while True:
+        # Cleared before the pass so a schedule change during it triggers another pass
+        event.clear()
+        delay = NOTIFICATION_POLL_SECONDS
         try:
-            now = datetime.now()
-            # "Starting of the day" - let's say 8:00 AM
-            # For testing/demo purposes, we might want to trigger it differently,
-            # but for a production-like feel, we'll check if we already sent today.
-            
-            db = get_database()
-            users_collection = db["users"]
-            
-            # Find all users with notifications enabled
-            async for user in users_collection.find({"notifications_enabled": True}):
-                email = user["email"]
-                last_sent = user.get("last_notification_sent_at") # YYYY-MM-DD
-                
-                today_str = now.strftime("%Y-%m-%d")
-                
-                if last_sent != today_str:
-                    print(f"Sending daily notification to {email}...")
-                    insight = await generate_insight_for_user(email)
-                    send_daily_insight_email(email, insight)
-                    
-                    # Update last sent date
-                    await users_collection.update_one(
-                        {"email": email},
-                        {"$set": {"last_notification_sent_at": today_str}}
-                    )
-            
+            await run_due_notifications()
+            delay = await _seconds_until_next_due()
         except Exception as e:
             print(f"Error in notification background task: {e}")
-            
-        # Wait for 1 hour before checking again
-        # In a real app, you'd use a proper scheduler, but this is a simple robust loop.
-        await asyncio.sleep(3600)
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
 
 def start_notification_service():
     """
     Entry point to start the background task.
+    Every worker calls this, but only the current lease holder runs the loop.
     """
-    asyncio.create_task(send_daily_notifications())
+    notification_lease.start(send_daily_notifications)
+
+async def stop_notification_service():
+    await notification_lease.stop()
@@ -5,7 +5,11 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from database import get_database
 from models import User
+from cache_utils import TTLCache
+import hashlib
+import metrics
 import os
+import time
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-should-be-in-env")
@@ -14,6 +18,20 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 43200 # 30 days
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Short-lived caches in front of JWT decoding and the user lookup.
+# Writes to a user document must await invalidate_user(), which bumps the
+# shared auth_version stamp; every worker compares its cached copy against
+# that stamp on each request, so changes and deletions apply everywhere at once.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_TTL_SECONDS = 300
+
+_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+_token_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_ENTRIES, ttl=TOKEN_CACHE_TTL_SECONDS)
+
+metrics.register("principal_cache", _principal_cache.stats)
+metrics.register("token_cache", _token_cache.stats)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -25,6 +43,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> dict:
+    """
+    Decode and verify a JWT, reusing earlier results for the same token.
+    Raises JWTError if the token is invalid or expired.
+    """
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        if payload.get("exp", 0) <= time.time():
+            _token_cache.pop(key)
+            raise JWTError("Signature has expired.")
+        return payload
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # Never keep a token around past its own expiry
+    remaining = payload.get("exp", 0) - time.time()
+    _token_cache.set(key, payload, ttl=min(TOKEN_CACHE_TTL_SECONDS, remaining))
+    return payload
+
+async def invalidate_user(email: str):
+    """Call after any write to the user's document so no worker keeps serving the old copy."""
+    _principal_cache.pop(email)
+    db = get_database()
+    await db.users.update_one({"email": email}, {"$inc": {"auth_version": 1}})
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -33,7 +76,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("user_id")
         if user_id is None:
             raise credentials_exception
@@ -41,9 +84,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
         
     db = get_database()
-    user = await db.users.find_one({"email": user_id}) # We use email as user_id for now based on current schema
-    
-    if user is None:
+    # Covered by the (email, auth_version) index, so this never fetches the document.
+    # A deleted account fails here on every worker, whatever is cached.
+    stamp = await db.users.find_one({"email": user_id}, {"auth_version": 1, "_id": 0})
+    if stamp is None:
+        _principal_cache.pop(user_id)
         raise credentials_exception
+
+    user = _principal_cache.get(user_id)
+    if user is None or user.get("auth_version", 0) != stamp.get("auth_version", 0):
+        user = await db.users.find_one({"email": user_id}) # We use email as user_id for now based on current schema
+        
+        if user is None:
+            raise credentials_exception
+        _principal_cache.set(user_id, user)
         
-    return user
+    # Handlers get their own copy so they can't mutate the cached document
+    return dict(user)
@@ -0,0 +1,73 @@
+import base64
+import json
+from typing import Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value, doc_id: ObjectId) -> str:
+    raw = json.dumps([sort_value, str(doc_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, doc_id = json.loads(raw)
+        return sort_value, ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def keyset_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    projection: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    pending: Optional[list] = None,
+) -> dict:
+    """
+    Newest-first page ordered by (sort_field, _id), both descending.
+    The cursor is the key of the last item returned, so every page is one
+    index range scan no matter how deep it is; nothing is skipped over.
+    `pending` holds documents not yet written (e.g. buffered chat messages)
+    to merge into the page.
+    """
+    filters = dict(query)
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        filters["$or"] = [
+            {sort_field: {"$lt": after[0]}},
+            {sort_field: after[0], "_id": {"$lt": after[1]}},
+        ]
+
+    # One extra document tells us whether another page exists
+    docs = await collection.find(filters, {**projection, sort_field: 1}).sort(
+        [(sort_field, -1), ("_id", -1)]
+    ).limit(limit + 1).to_list(length=limit + 1)
+
+    if pending:
+        seen = {doc["_id"] for doc in docs}
+        for doc in pending:
+            key = (doc[sort_field], doc["_id"])
+            if doc["_id"] not in seen and (after is None or key < after):
+                docs.append({field: doc[field] for field in ("_id", sort_field, *projection) if field in doc})
+        docs.sort(key=lambda doc: (doc[sort_field], doc["_id"]), reverse=True)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1][sort_field], docs[-1]["_id"]) if has_more else None
+
+    items = []
+    for doc in docs:
+        item = {"id": str(doc.pop("_id"))}
+        item.update(doc)
+        items.append(item)
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,229 @@
+import json
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import get_database
+from oauth2 import decode_access_token
+import metrics
+
+# Per-route limits as "<count>/<period>" for each scope:
+#   user   - per authenticated user (falls back to the client IP when anonymous)
+#   ip     - per client IP
+#   global - shared by everyone hitting the route
+# Each limit is a token bucket holding <count> tokens that refills over <period>.
+# Override or extend with RATE_LIMITS='{"POST /chat": {"user": "30/minute"}}'.
+DEFAULT_RATE_LIMITS = {
+    "POST /auth/login": {"ip": "10/minute", "global": "300/minute"},
+    "POST /auth/forgot-password": {"ip": "5/hour", "global": "60/minute"},
+    "POST /chat": {"user": "20/minute", "global": "600/minute"},
+    "GET /chat/daily-insight": {"user": "10/minute", "global": "300/minute"},
+    "GET /user/export": {"user": "5/hour"},
+}
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "mongo"
+# Only trust X-Forwarded-For when running behind a proxy that sets it
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimit:
+    def __init__(self, scope: str, count: int, period: float):
+        self.scope = scope
+        self.capacity = count
+        self.rate = count / period  # tokens per second
+
+    @classmethod
+    def parse(cls, scope: str, spec: str) -> "RateLimit":
+        count, period = spec.split("/")
+        return cls(scope, int(count), _PERIODS[period.strip().rstrip("s")])
+
+
+def load_rate_limits() -> dict:
+    config = dict(DEFAULT_RATE_LIMITS)
+    overrides = os.getenv("RATE_LIMITS")
+    if overrides:
+        config.update(json.loads(overrides))
+
+    limits = {}
+    for route, scopes in config.items():
+        method, path = route.split(" ", 1)
+        limits[(method.upper(), path.rstrip("/") or "/")] = [
+            RateLimit.parse(scope, spec) for scope, spec in scopes.items()
+        ]
+    return limits
+
+
+class MemoryBucketStore:
+    """
+    Token buckets in a dict, refilled lazily on access.
+    Idle buckets are swept when the table has doubled since the last sweep,
+    which keeps both memory and the per-request cost amortized O(1).
+    """
+
+    def __init__(self):
+        self._buckets = {}  # key -> [tokens, last_refill, capacity, rate]
+        self._sweep_at = 1024
+
+    async def hit(self, key: str, capacity: int, rate: float) -> float:
+        """Take one token. Returns 0 if allowed, otherwise seconds until a token is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self._sweep_at:
+                self._sweep(now)
+            bucket = self._buckets[key] = [capacity, now, capacity, rate]
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+    async def refund(self, key: str, capacity: int):
+        """Give back a token taken by hit() for a request that was rejected anyway."""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(capacity, bucket[0] + 1)
+
+    def _sweep(self, now: float):
+        # A bucket idle long enough to be full again is the same as no bucket
+        self._buckets = {
+            key: b for key, b in self._buckets.items()
+            if b[0] + (now - b[1]) * b[3] < b[2]
+        }
+        self._sweep_at = max(1024, 2 * len(self._buckets))
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class MongoBucketStore:
+    """
+    Shared token buckets for multi-worker deployments.
+    Refill and take happen in one atomic pipeline update per request.
+    """
+
+    async def hit(self, key: str, capacity: int, rate: float) -> float:
+        db = get_database()
+        now = datetime.utcnow()
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}]}
+        pipeline = [
+            {"$set": {"tokens": refilled, "updated_at": now}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {
+                "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                # Let Mongo drop buckets once they'd be full again anyway
+                "expires_at": now + timedelta(seconds=capacity / rate)
+            }},
+        ]
+        try:
+            bucket = await db["rate_limits"].find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker created the bucket between our match and insert;
+            # it exists now, so the retry is a plain update
+            bucket = await db["rate_limits"].find_one_and_update(
+                {"_id": key}, pipeline, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        if bucket["allowed"]:
+            return 0.0
+        return (1 - bucket["tokens"]) / rate
+
+    async def refund(self, key: str, capacity: int):
+        """Give back a token taken by hit() for a request that was rejected anyway."""
+        db = get_database()
+        await db["rate_limits"].update_one(
+            {"_id": key},
+            [{"$set": {"tokens": {"$min": [capacity, {"$add": ["$tokens", 1]}]}}}]
+        )
+
+
+async def init_rate_limit_indexes(db):
+    await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware that enforces the configured limits before routing."""
+
+    def __init__(self, app, limits: Optional[dict] = None, store=None):
+        self.app = app
+        self.limits = limits if limits is not None else load_rate_limits()
+        if store is None:
+            store = MongoBucketStore() if RATE_LIMIT_BACKEND == "mongo" else MemoryBucketStore()
+        self.store = store
+        self.rejected = 0
+        metrics.register("rate_limit", self.stats)
+
+    def _client_ip(self, scope) -> str:
+        if TRUST_PROXY_HEADERS:
+            for name, value in scope.get("headers", []):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _user_id(self, scope) -> Optional[str]:
+        for name, value in scope.get("headers", []):
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() != "bearer" or not token:
+                    return None
+                try:
+                    return decode_access_token(token).get("user_id")
+                except Exception:
+                    return None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        rules = self.limits.get(route)
+        if not rules:
+            return await self.app(scope, receive, send)
+
+        ip = self._client_ip(scope)
+        user_id = None
+        taken = []
+        for rule in rules:
+            if rule.scope == "global":
+                identity = "*"
+            elif rule.scope == "user":
+                user_id = user_id or self._user_id(scope)
+                identity = f"user:{user_id}" if user_id else f"ip:{ip}"
+            else:
+                identity = f"ip:{ip}"
+
+            key = f"{route[0]} {route[1]}|{rule.scope}|{identity}"
+            retry_after = await self.store.hit(key, rule.capacity, rule.rate)
+            if retry_after > 0:
+                # The request doesn't go through, so it shouldn't count against the other limits
+                for earlier_key, earlier_capacity in taken:
+                    await self.store.refund(earlier_key, earlier_capacity)
+                self.rejected += 1
+                response = JSONResponse(
+                    {"detail": "Too many requests. Please wait a moment and try again."},
+                    status_code=429,
+                    headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                )
+                return await response(scope, receive, send)
+            taken.append((key, rule.capacity))
+
+        return await self.app(scope, receive, send)
+
+    def stats(self) -> dict:
+        stats = {"rejected": self.rejected}
+        if isinstance(self.store, MemoryBucketStore):
+            stats["buckets"] = len(self.store)
+        return stats
@@ -0,0 +1,181 @@
+import os
+import time
+from bisect import bisect_left
+import metrics
+
+# Upper bounds (seconds / bytes) of the histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "respira")
+# Label for requests that matched no route, so 404 scans don't each create a series
+UNMATCHED_ROUTE = "<unmatched>"
+# Any other method string a client sends is counted as OTHER, for the same reason
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+OTHER_METHOD = "OTHER"
+
+
+class Histogram:
+    """Per-bucket counts plus sum and count. Buckets are made cumulative only when exported."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """
+    Per-process request counters. Everything runs on the event loop thread,
+    so plain dicts and ints are enough: recording a request costs a few dict
+    lookups and no locks. Counts are per worker process, so a scrape reports
+    whichever process answered it (process_start_time_seconds tells them apart).
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = {}     # (method, route, status) -> count
+        self.latency = {}      # (method, route) -> Histogram
+        self.sizes = {}        # (method, route) -> Histogram
+        self.in_flight = {}    # method -> requests currently being handled
+
+    def record(self, method: str, route: str, status: int, seconds: float, size: int):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        key = (method, route)
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.sizes[key] = Histogram(SIZE_BUCKETS)
+        latency.observe(seconds)
+        self.sizes[key].observe(size)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        p = METRICS_PREFIX
+        lines = [
+            f"# HELP {p}_process_start_time_seconds Start time of this worker process.",
+            f"# TYPE {p}_process_start_time_seconds gauge",
+            f"{p}_process_start_time_seconds {self.started_at:.3f}",
+            f"# HELP {p}_http_requests_total Requests handled, by route and status code.",
+            f"# TYPE {p}_http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f'{p}_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+        lines += [
+            f"# HELP {p}_http_requests_in_flight Requests currently being handled.",
+            f"# TYPE {p}_http_requests_in_flight gauge",
+        ]
+        for method, count in sorted(self.in_flight.items()):
+            lines.append(f'{p}_http_requests_in_flight{{method="{method}"}} {count}')
+
+        lines += _histogram_lines(f"{p}_http_request_duration_seconds", "Time to the last response byte.", self.latency)
+        lines += _histogram_lines(f"{p}_http_response_size_bytes", "Response body size as sent (after compression).", self.sizes)
+        lines += _stats_lines(p, metrics.collect())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound) -> str:
+    return repr(float(bound))
+
+
+def _histogram_lines(name: str, help_text: str, histograms: dict) -> list:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), hist in sorted(histograms.items()):
+        labels = f'method="{method}",route="{_escape(route)}"'
+        cumulative = 0
+        for bound, count in zip(hist.bounds, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{_format_bound(bound)}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+        lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+        lines.append(f"{name}_count{{{labels}}} {hist.count}")
+    return lines
+
+
+def _stats_lines(prefix: str, snapshot: dict) -> list:
+    """
+    The /stats providers as untyped gauges: {"email_outbox": {"retried": 3}}
+    becomes respira_email_outbox_retried 3. Nested dicts (e.g. per insight
+    section) become a "key" label.
+    """
+    lines = []
+    for provider, values in sorted(snapshot.items()):
+        for field, value in values.items():
+            if not isinstance(value, dict):
+                if isinstance(value, (int, float)):
+                    lines.append(f"{prefix}_{provider}_{field} {float(value)}")
+                continue
+            for key, inner in value.items():
+                label = f'{{key="{_escape(str(key))}"}}'
+                if isinstance(inner, dict):
+                    for inner_field, number in inner.items():
+                        if isinstance(number, (int, float)):
+                            lines.append(f"{prefix}_{provider}_{inner_field}{label} {float(number)}")
+                elif isinstance(inner, (int, float)):
+                    lines.append(f"{prefix}_{provider}_{field}{label} {float(inner)}")
+    return lines
+
+
+request_metrics = RequestMetrics()
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware that times every HTTP request and records its status and
+    body size. Routes are labelled by their path template (/jobs/{job_id}),
+    never the raw path, and methods by a fixed set, so label cardinality
+    stays bounded.
+    """
+
+    def __init__(self, app, recorder: RequestMetrics = request_metrics):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        if method not in KNOWN_METHODS:
+            method = OTHER_METHOD
+        in_flight = self.recorder.in_flight
+        in_flight[method] = in_flight.get(method, 0) + 1
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight[method] -= 1
+            self.recorder.record(method, _route_template(scope), status, time.perf_counter() - start, size)
+
+
+def _route_template(scope) -> str:
+    # FastAPI resolves included routers lazily: scope["route"] is the route as
+    # declared (/{job_id}) and the prefixed template sits in its own scope entry
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or UNMATCHED_ROUTE
@@ -0,0 +1,43 @@
+from typing import Any, Optional
+import numpy as np
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any):
+    # Types orjson doesn't know: models built with model_construct,
+    # numpy scalars left over from pandas, and Mongo ids
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson. Used as the app's default response class."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def respond(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> FastJSONResponse:
+    """
+    Return server-built data as-is. FastAPI passes Response objects straight
+    through, so this skips jsonable_encoder and response_model re-validation.
+    """
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
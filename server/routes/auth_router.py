@@ -4,15 +4,21 @@ from models import (
     User, UserSignup, UserLogin, 
     GoogleLoginRequest, ForgotPasswordRequest, ResetPasswordRequest
 )
-from auth_utils import get_password_hash, verify_password, generate_reset_token, validate_password_strength
+from auth_utils import (
+    get_password_hash_async, verify_password_async, password_needs_rehash,
+    generate_reset_token, hash_reset_token, validate_password_strength
+)
 from google_utils import verify_google_token
-from email_utils import send_reset_email
+from email_utils import build_reset_email
+from email_outbox import enqueue_email
 from datetime import datetime, timedelta
 import secrets
-from oauth2 import create_access_token
+from oauth2 import create_access_token, invalidate_user
 
 router = APIRouter()
 
+RESET_TOKEN_TTL_MINUTES = 15
+
 @router.post("/signup")
 async def signup(user_data: UserSignup):
     db = get_database()
@@ -30,7 +36,7 @@ async def signup(user_data: UserSignup):
             raise HTTPException(status_code=400, detail=msg)
 
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         new_user = User(
             name=user_data.name,
             email=user_data.email.lower(),
@@ -58,13 +64,16 @@ async def login(login_data: UserLogin):
             raise HTTPException(status_code=404, detail="Account does not exist")
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not verify_password(login_data.password, user["password_hash"]):
+    if not await verify_password_async(login_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Update last login
+    # Update last login (and upgrade the hash if the configured bcrypt cost changed)
+    login_update = {"last_login": datetime.utcnow().isoformat()}
+    if password_needs_rehash(user["password_hash"]):
+        login_update["password_hash"] = await get_password_hash_async(login_data.password)
     await users.update_one(
         {"_id": user["_id"]},
-        {"$set": {"last_login": datetime.utcnow().isoformat()}}
+        {"$set": login_update}
     )
 
     # Create access token
@@ -85,7 +94,7 @@ async def login(login_data: UserLogin):
 @router.post("/google")
 async def google_auth(request: GoogleLoginRequest):
     # Verify token
-    google_user = verify_google_token(request.token)
+    google_user = await verify_google_token(request.token)
     if not google_user:
         raise HTTPException(status_code=400, detail="Invalid Google token")
 
@@ -152,22 +161,32 @@ async def forgot_password(request: ForgotPasswordRequest):
         # User requested explicit feedback if account doesn't exist
         raise HTTPException(status_code=404, detail="Account does not exist. Please create an account.")
 
-    # Generate token
+    # Generate token; only its SHA-256 is stored, Mongo's TTL index expires it
     reset_token = generate_reset_token()
-    expiry = datetime.utcnow() + timedelta(minutes=15)
-    
-    # Store token in user doc (simple approach) or separate collection
-    await users.update_one(
-        {"_id": user["_id"]},
-        {"$set": {
-            "reset_token": reset_token,
-            "reset_token_expiry": expiry.isoformat()
-        }}
+    token_hash = hash_reset_token(reset_token)
+    now = datetime.utcnow()
+    expires_at = now + timedelta(minutes=RESET_TOKEN_TTL_MINUTES)
+
+    # A new request supersedes any earlier link for this account
+    resets = db.password_resets
+    await resets.delete_many({"email": email})
+    await resets.insert_one({
+        "token_hash": token_hash,
+        "email": email,
+        "created_at": now,
+        "expires_at": expires_at
+    })
+
+    # Queue the email; the outbox worker delivers (and retries) it. The body
+    # holds the plaintext token, so the outbox row goes when the token expires
+    subject, body = build_reset_email(reset_token)
+    await enqueue_email(
+        email, subject, body,
+        idempotency_key=f"password-reset:{token_hash}",
+        kind="password_reset",
+        expires_at=expires_at
     )
 
-    # Send email
-    send_reset_email(email, reset_token)
-
     return {"status": "success", "message": "Reset link sent to your email!"}
 
 @router.post("/reset-password")
@@ -175,36 +194,35 @@ async def reset_password(request: ResetPasswordRequest):
     db = get_database()
     users = db.users
 
-    # Find user with valid token
-    # Note: In real app, consider atomic checks or finding by token
-    token = request.token.strip()
-    user = await users.find_one({"reset_token": token})
-    
-    if not user:
-        raise HTTPException(status_code=400, detail="Invalid or expired token")
+    resets = db.password_resets
+    token_hash = hash_reset_token(request.token.strip())
 
-    expiry_str = user.get("reset_token_expiry")
-    if not expiry_str:
-        raise HTTPException(status_code=400, detail="Invalid token")
-        
-    expiry = datetime.fromisoformat(expiry_str)
-    if datetime.utcnow() > expiry:
-        raise HTTPException(status_code=400, detail="Token expired")
+    # Look the token up first so a weak new password doesn't burn the link
+    reset = await resets.find_one({"token_hash": token_hash, "expires_at": {"$gt": datetime.utcnow()}})
+    if not reset:
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
 
     # Validate new password strength
-    is_valid, msg = validate_password_strength(request.new_password, user["email"])
+    is_valid, msg = validate_password_strength(request.new_password, reset["email"])
     if not is_valid:
         raise HTTPException(status_code=400, detail=msg)
 
-    # Update password
-    new_hash = get_password_hash(request.new_password)
-    await users.update_one(
-        {"_id": user["_id"]},
-        {"$set": {
-            "password_hash": new_hash,
-            "reset_token": None,
-            "reset_token_expiry": None
-        }}
+    # Redeem atomically: only one request can delete (and so use) the token
+    reset = await resets.find_one_and_delete({"token_hash": token_hash, "expires_at": {"$gt": datetime.utcnow()}})
+    if not reset:
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+
+    # Update password (and drop tokens left on the user doc by the old flow)
+    new_hash = await get_password_hash_async(request.new_password)
+    result = await users.update_one(
+        {"email": reset["email"]},
+        {
+            "$set": {"password_hash": new_hash},
+            "$unset": {"reset_token": "", "reset_token_expiry": ""}
+        }
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=400, detail="Invalid or expired token")
+    await invalidate_user(reset["email"])
 
     return {"status": "success", "message": "Password updated successfully"}
@@ -1,15 +1,123 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from datetime import date, datetime, timedelta
-from typing import List
+from typing import List, Optional
 from database import get_database
 from models import CalendarResponse, CalendarDay, CalendarStats, LifetimeStats
 from oauth2 import get_current_user
+from responses import respond
+from data_version import check_etag, etag_headers
 from fastapi import Depends
 
 router = APIRouter()
 
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+MAX_CALENDAR_RANGE_YEARS = 10
+
+async def get_first_log_date(user_id: str) -> Optional[str]:
+    """
+    First-ever log date, kept on the user document by $min on every log save.
+    Older accounts without it are backfilled from smoke_logs on first use.
+    """
+    db = get_database()
+    user = await db["users"].find_one({"email": user_id}, {"first_log_date": 1, "_id": 0})
+    if user and user.get("first_log_date"):
+        return user["first_log_date"]
+
+    first_log = await db["smoke_logs"].find_one({"user_id": user_id}, {"date": 1}, sort=[("date", 1)])
+    if not first_log:
+        return None
+    await db["users"].update_one({"email": user_id}, {"$min": {"first_log_date": first_log["date"]}})
+    return first_log["date"]
+
+@router.get("")
+async def get_calendar_range(
+    from_month: str = Query(..., alias="from", pattern=MONTH_PATTERN),
+    to_month: str = Query(..., alias="to", pattern=MONTH_PATTERN),
+    prefetch_years: int = Query(0, ge=0, le=2),
+    format: str = Query("full", pattern="^(full|compact|rle)$"),
+    current_user: dict = Depends(get_current_user),
+    etag: str = Depends(check_etag)
+):
+    """
+    Any span of months from one range query, e.g. ?from=2025-01&to=2026-12.
+    prefetch_years widens the span by whole years on each side so the client
+    can flip to adjacent years without another request.
+    Streaks are counted across the whole span, including over New Year.
+    """
+    start = datetime.strptime(from_month, "%Y-%m").date()
+    end = _month_end(datetime.strptime(to_month, "%Y-%m").date())
+    if start > end:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    if prefetch_years:
+        start = start.replace(year=start.year - prefetch_years)
+        end = _month_end(end.replace(day=1, year=end.year + prefetch_years))
+    if end.year - start.year >= MAX_CALENDAR_RANGE_YEARS:
+        raise HTTPException(status_code=400, detail=f"Calendar range is limited to {MAX_CALENDAR_RANGE_YEARS} years")
+
+    db = get_database()
+    user_id = current_user["email"]
+    cursor = db["smoke_logs"].find(
+        {"user_id": user_id, "date": {"$gte": start.strftime("%Y-%m-%d"), "$lte": end.strftime("%Y-%m-%d")}},
+        {"date": 1, "cigarettes": 1, "_id": 0}
+    )
+    logs = await cursor.to_list(length=None)
+    first_log_date = await get_first_log_date(user_id)
+
+    return respond(build_calendar_range(start, end, logs, first_log_date, format), headers=etag_headers(etag))
+
+def _month_end(day: date) -> date:
+    next_month = day.replace(day=28) + timedelta(days=4)
+    return next_month - timedelta(days=next_month.day)
+
+def build_calendar_range(start: date, end: date, logs: list, first_log_date: Optional[str], format: str = "full") -> dict:
+    """Days, per-month totals and span-wide stats from start to end inclusive."""
+    statuses, counts = _day_columns(start, end, logs, first_log_date)
+    smoke_free_count, days_smoked_count, total_cigarettes = _day_totals(statuses, counts)
+
+    # Per-month totals, sliced out of the day columns
+    months = []
+    month_start = start
+    offset = 0
+    while month_start <= end:
+        days_in_month = (_month_end(month_start) - month_start).days + 1
+        month_free, month_smoked, month_cigarettes = _day_totals(
+            statuses[offset:offset + days_in_month], counts[offset:offset + days_in_month]
+        )
+        months.append({
+            "month": month_start.strftime("%Y-%m"),
+            "smoke_free_days": month_free,
+            "days_smoked": month_smoked,
+            "total_cigarettes": month_cigarettes
+        })
+        offset += days_in_month
+        month_start = _month_end(month_start) + timedelta(days=1)
+
+    payload = {
+        "from": start.strftime("%Y-%m"),
+        "to": end.strftime("%Y-%m"),
+        "first_log_date": first_log_date,
+        "min_year": int(first_log_date[:4]) if first_log_date else datetime.now().year,
+        "stats": {
+            "smoke_free_days": smoke_free_count,
+            "days_smoked": days_smoked_count,
+            "longest_streak": _longest_streak(statuses),
+            "money_spent": days_smoked_count * 20,  # Approx cost, as in the yearly view
+            "total_cigarettes": total_cigarettes
+        },
+        "months": months,
+    }
+    if format == "full":
+        payload["calendar_days"] = _calendar_day_models(start, statuses, counts)
+    else:
+        payload.update(_encode_days(start, statuses, counts, run_length=format == "rle"))
+    return payload
+
 @router.get("/{year}", response_model=CalendarResponse)
-async def get_calendar(year: int, current_user: dict = Depends(get_current_user)):
+async def get_calendar(year: int, format: str = Query("full", pattern="^(full|compact|rle)$"), current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
+    """
+    format=full returns one object per day. The opt-in compact formats skip those:
+    compact sends parallel per-day arrays, rle sends status runs plus the non-zero counts.
+    """
     db = get_database()
     logs_collection = db["smoke_logs"]
     
@@ -26,19 +134,71 @@ async def get_calendar(year: int, current_user: dict = Depends(get_current_user)
     })
     
     logs = await cursor.to_list(length=366)
-    logs_map = {log["date"]: log["cigarettes"] for log in logs}
 
-    # Fetch the FIRST EVER log to determine start date of usage
-    first_log = await logs_collection.find_one(
-        {"user_id": user_id},
-        sort=[("date", 1)]
-    )
-    first_log_date = first_log["date"] if first_log else None
+    # First-ever log determines the start date of usage
+    first_log_date = await get_first_log_date(user_id)
+
+    if format != "full":
+        # Returned as-is, skipping per-day model validation
+        return respond(build_compact_calendar(year, logs, first_log_date, run_length=format == "rle"), headers=etag_headers(etag))
+    return respond(build_calendar(year, logs, first_log_date), headers=etag_headers(etag))
+
+def build_calendar(year: int, logs: list, first_log_date: Optional[str]) -> CalendarResponse:
+    """Calendar days and stats for one year from that year's logs. Pure, so /dashboard can reuse it."""
+    statuses, counts, stats = _calendar_columns(year, logs, first_log_date)
+    calendar_days = _calendar_day_models(date(year, 1, 1), statuses, counts)
+    return CalendarResponse.model_construct(calendar_days=calendar_days, stats=stats)
 
-    # 2. Generate all days in the year and determine status
-    calendar_days = []
+def build_compact_calendar(year: int, logs: list, first_log_date: Optional[str], run_length: bool = False) -> dict:
+    statuses, counts, stats = _calendar_columns(year, logs, first_log_date)
+    payload = _encode_days(date(year, 1, 1), statuses, counts, run_length)
+    payload["stats"] = stats.model_dump()
+    return payload
+
+def _calendar_day_models(start: date, statuses: list, counts: list) -> list:
+    # Server-built data, so skip per-field validation
+    return [
+        CalendarDay.model_construct(date=(start + timedelta(days=i)).strftime("%Y-%m-%d"), status=status, cigarettes=count)
+        for i, (status, count) in enumerate(zip(statuses, counts))
+    ]
+
+# Status for code i in the compact formats
+CALENDAR_STATUS_CODES = ["untracked", "smoke-free", "smoked", "future"]
+_STATUS_INDEX = {status: i for i, status in enumerate(CALENDAR_STATUS_CODES)}
+
+def _encode_days(start: date, statuses: list, counts: list, run_length: bool) -> dict:
+    """
+    Day i is start_date + i days.
+    compact: "statuses" holds a status code per day and "cigarettes" a count per day.
+    rle: "status_runs" holds [code, length] pairs and "cigarettes" maps day index -> count for non-zero days only.
+    """
+    codes = [_STATUS_INDEX[status] for status in statuses]
+    payload = {
+        "format": "rle" if run_length else "compact",
+        "start_date": start.strftime("%Y-%m-%d"),
+        "status_codes": CALENDAR_STATUS_CODES,
+    }
+    if run_length:
+        runs = []
+        for code in codes:
+            if runs and runs[-1][0] == code:
+                runs[-1][1] += 1
+            else:
+                runs.append([code, 1])
+        payload["status_runs"] = runs
+        payload["cigarettes"] = {str(i): count for i, count in enumerate(counts) if count}
+    else:
+        payload["statuses"] = codes
+        payload["cigarettes"] = counts
+    return payload
+
+def _day_columns(start: date, end: date, logs: list, first_log_date: Optional[str]) -> tuple[list, list]:
+    """Per-day status and cigarette lists from start to end inclusive."""
+    logs_map = {log["date"]: log["cigarettes"] for log in logs}
+
+    statuses = []
+    counts = []
     today = datetime.now().date()
-    today_str = today.strftime("%Y-%m-%d")
     
     # Determine Usage Start Date
     # STRICT RULE: Tracking starts ONLY from the first log date.
@@ -47,14 +207,8 @@ async def get_calendar(year: int, current_user: dict = Depends(get_current_user)
     if first_log_date:
         effective_start_date = datetime.strptime(first_log_date, "%Y-%m-%d").date()
 
-    current_date = date(year, 1, 1)
-    last_date = date(year, 12, 31)
-    
-    smoke_free_count = 0
-    days_smoked_count = 0
-    total_cigarettes = 0
-    
-    while current_date <= last_date:
+    current_date = start
+    while current_date <= end:
         date_str = current_date.strftime("%Y-%m-%d")
         cigarettes_count = logs_map.get(date_str, 0)
         
@@ -63,46 +217,55 @@ async def get_calendar(year: int, current_user: dict = Depends(get_current_user)
              status = "future"
         elif current_date == today:
             # Today: Red if smoked, otherwise grey (pending completion of day)
-            if cigarettes_count > 0:
-                status = "smoked"
-                total_cigarettes += cigarettes_count
-                days_smoked_count += 1
-            else:
-                status = "future"
+            status = "smoked" if cigarettes_count > 0 else "future"
         elif effective_start_date is None or current_date < effective_start_date:
             # Before first log (or no logs yet): Dark Grey
             status = "untracked"
         elif cigarettes_count > 0:
             status = "smoked"
-            total_cigarettes += cigarettes_count
-            days_smoked_count += 1
         else:
             # Past date, within usage period, NO cigarettes => Smoke Free (Green)
             status = "smoke-free"
-            smoke_free_count += 1
             
-        calendar_days.append(CalendarDay(date=date_str, status=status, cigarettes=cigarettes_count))
+        statuses.append(status)
+        counts.append(cigarettes_count)
         current_date += timedelta(days=1)
+    return statuses, counts
 
-    # 3. Calculate longest streak (consecutive smoke-free days)
-    # Note: We should probably consider days before this year to get accurate streak if the year starts smoke-free
-    # But the request says "calculate and return ... based on calendar data for the given year" (implied)
-    # Let's calculate it based on the data points we have in the response list for simplicity/request scope
-    
+def _day_totals(statuses: list, counts: list) -> tuple[int, int, int]:
+    """Smoke-free days, smoked days and cigarettes on smoked days."""
+    smoke_free_count = 0
+    days_smoked_count = 0
+    total_cigarettes = 0
+    for status, count in zip(statuses, counts):
+        if status == "smoke-free":
+            smoke_free_count += 1
+        elif status == "smoked":
+            days_smoked_count += 1
+            total_cigarettes += count
+    return smoke_free_count, days_smoked_count, total_cigarettes
+
+def _longest_streak(statuses: list) -> int:
+    """Longest run of consecutive smoke-free days; untracked and future days neither add nor break a run."""
     longest_streak = 0
     current_streak = 0
-    
-    for day in calendar_days:
-        if day.status == "smoke-free":
+    for status in statuses:
+        if status == "smoke-free":
             current_streak += 1
             if current_streak > longest_streak:
                 longest_streak = current_streak
-        elif day.status == "smoked":
+        elif status == "smoked":
             current_streak = 0
-        # future days don't break or add to streak in a past/current context, 
-        # but for simplicity, we stop counting at today.
-        if day.date == today_str:
-            break
+    return longest_streak
+
+def _calendar_columns(year: int, logs: list, first_log_date: Optional[str]) -> tuple[list, list, CalendarStats]:
+    """Per-day status and cigarette lists for the year, plus the year's stats."""
+    statuses, counts = _day_columns(date(year, 1, 1), date(year, 12, 31), logs, first_log_date)
+    smoke_free_count, days_smoked_count, total_cigarettes = _day_totals(statuses, counts)
+
+    # 3. Calculate longest streak (consecutive smoke-free days)
+    # Per-year views only see this year's days; GET /calendar?from=&to= counts streaks across years
+    longest_streak = _longest_streak(statuses)
 
     # 4. Calculate monthly totals
     money_spent = days_smoked_count * 20  # Approx cost
@@ -118,81 +281,93 @@ async def get_calendar(year: int, current_user: dict = Depends(get_current_user)
         elif first_log_dt.year < year:
             first_log_month = 0 # Started previous year, so show all months
             
+        logs_map = {log["date"]: log["cigarettes"] for log in logs}
         for d_str, count in logs_map.items():
             d_obj = datetime.strptime(d_str, "%Y-%m-%d")
             monthly_counts[d_obj.month - 1] += count
 
-    return CalendarResponse(
-        calendar_days=calendar_days,
-        stats=CalendarStats(
-            smoke_free_days=smoke_free_count,
-            days_smoked=days_smoked_count,
-            longest_streak=longest_streak,
-            money_spent=money_spent,
-            total_cigarettes=total_cigarettes,
-            monthly_counts=monthly_counts,
-            first_log_month=first_log_month,
-            min_year=min_year
-        )
+    return statuses, counts, CalendarStats.model_construct(
+        smoke_free_days=smoke_free_count,
+        days_smoked=days_smoked_count,
+        longest_streak=longest_streak,
+        money_spent=money_spent,
+        total_cigarettes=total_cigarettes,
+        monthly_counts=monthly_counts,
+        first_log_month=first_log_month,
+        min_year=min_year
     )
 
 @router.get("/stats/lifetime", response_model=LifetimeStats)
-async def get_lifetime_stats(current_user: dict = Depends(get_current_user)):
+async def get_lifetime_stats(current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
     db = get_database()
     logs_collection = db["smoke_logs"]
     
-    # Fetch ALL logs
-    cursor = logs_collection.find({"user_id": current_user["email"]}).sort("date", 1)
-    logs = await cursor.to_list(length=10000)
-    
-    if not logs:
-        return LifetimeStats(current_streak=0, longest_streak=0, total_cigarettes=0)
+    # Stream the logs in date order with only the fields the streak math needs
+    cursor = logs_collection.find(
+        {"user_id": current_user["email"]},
+        {"date": 1, "cigarettes": 1, "_id": 0}
+    ).sort("date", 1)
+    streaks = LifetimeStreaks()
+    async for log in cursor:
+        streaks.add(log)
 
-    # 1. Identify Start Date and Smoked Set
-    first_log_date = datetime.strptime(logs[0]["date"], "%Y-%m-%d").date()
-    today = datetime.now().date()
-    
-    smoked_dates = set()
-    total_cigarettes = 0
+    return respond(streaks.result(), headers=etag_headers(etag))
+
+def compute_lifetime_stats(logs: list) -> LifetimeStats:
+    """Lifetime streaks and totals from all of a user's logs, sorted by date."""
+    streaks = LifetimeStreaks()
     for log in logs:
-        if log["cigarettes"] > 0:
-            smoked_dates.add(datetime.strptime(log["date"], "%Y-%m-%d").date())
-            total_cigarettes += log["cigarettes"]
-            
-    # 2. Iterate day by day from Start Date to Yesterday (exclude Today from completed history)
-    # If today is the start date, loop range is empty -> streak 0. Correct.
-    
-    longest_streak = 0
-    current_iter_streak = 0
-    
-    # Calculate end_date (Yesterday)
-    end_date = today - timedelta(days=1)
-    
-    # Standard Loop
-    d = first_log_date
-    while d <= end_date:
-        if d in smoked_dates:
-            current_iter_streak = 0
-        else:
-            current_iter_streak += 1
-            if current_iter_streak > longest_streak:
-                longest_streak = current_iter_streak
-        d += timedelta(days=1)
-        
-    # 3. Calculate "Current Streak" (Streak ending yesterday)
-    # It is effectively the value of current_iter_streak after the loop finishes.
-    # UNLESS we want to be fancy about "broken today".
-    # But usually current streak = consecutive days up to now.
-    current_streak = current_iter_streak
-    
-    # If the user smoked TODAY, usually "current streak" is technically 0?
-    # Or does it reset tomorrow?
-    # Typically: You have a 5 day streak. You smoke today. Streak is broken -> 0.
-    if today in smoked_dates:
-        current_streak = 0
-        
-    return LifetimeStats(
-        current_streak=current_streak, 
-        longest_streak=longest_streak, 
-        total_cigarettes=total_cigarettes
-    )
+        streaks.add(log)
+    return streaks.result()
+
+class LifetimeStreaks:
+    """
+    Streak accumulator fed one log at a time in date order, in constant memory.
+    Tracking starts at the first log and completed history ends yesterday.
+    Every smoke-free run is the gap between two consecutive smoked dates,
+    so only smoked days cost any work, not every calendar day.
+    """
+
+    def __init__(self):
+        self.today = datetime.now().date()
+        self.end_date = self.today - timedelta(days=1)  # Yesterday
+        self.first_log_date = None
+        self.last_smoked = None  # Day before the current run of smoke-free days
+        self.longest_streak = 0
+        self.total_cigarettes = 0
+        self.smoked_today = False
+
+    def add(self, log: dict):
+        if self.first_log_date is None:
+            self.first_log_date = date.fromisoformat(log["date"])
+            self.last_smoked = self.first_log_date - timedelta(days=1)
+
+        if log["cigarettes"] <= 0:
+            return
+        self.total_cigarettes += log["cigarettes"]
+
+        smoked = date.fromisoformat(log["date"])
+        if smoked == self.today:
+            self.smoked_today = True
+        # Repeated dates and days after yesterday don't end a run
+        if self.last_smoked < smoked <= self.end_date:
+            self.longest_streak = max(self.longest_streak, (smoked - self.last_smoked).days - 1)
+            self.last_smoked = smoked
+
+    def result(self) -> LifetimeStats:
+        if self.first_log_date is None:
+            return LifetimeStats.model_construct(current_streak=0, longest_streak=0, total_cigarettes=0)
+
+        # The run still open at yesterday is the current streak
+        current_streak = max(0, (self.end_date - self.last_smoked).days)
+        longest_streak = max(self.longest_streak, current_streak)
+
+        # Typically: You have a 5 day streak. You smoke today. Streak is broken -> 0.
+        if self.smoked_today:
+            current_streak = 0
+
+        return LifetimeStats.model_construct(
+            current_streak=current_streak,
+            longest_streak=longest_streak,
+            total_cigarettes=self.total_cigarettes
+        )
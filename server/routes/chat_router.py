@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from database import get_database
 from dotenv import load_dotenv
@@ -9,6 +9,12 @@ from datetime import datetime
 from models import ChatMessage
 from fastapi import Depends
 from oauth2 import get_current_user
+from chat_cache import chat_response_cache, CHAT_CACHE_ENABLED
+from chat_history_writer import chat_history_writer
+from llm_client import get_groq_client, create_chat_completion, LLMOverloaded
+import random
+from pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from responses import respond
 
 # Load environment variables
 load_dotenv()
@@ -50,6 +56,11 @@ FALLBACK_RESPONSES = {
     'harmful': "I'm concerned about what you shared. If you're going through a difficult time, please reach out to a crisis helpline or mental health professional. You're not alone, and support is available.",
     'off_topic': "I'm here specifically to help you with your smoking journey—understanding patterns, managing urges, and staying motivated. Is there something about your quit journey I can help with?",
     'empty': "I didn't catch that. What would you like to know about your smoking habits or progress?",
+    'busy': [
+        "I'm here with you. Give me a moment and send that again—I want to give it proper attention.",
+        "Lots of people are reaching out right now. Take a slow breath, and try me again in a minute.",
+        "I'm a little busy this second. While you wait, notice what triggered this moment—we can talk it through shortly."
+    ],
     'ok_neutral': [
         "I'm here whenever you need to talk or reflect on something.",
         "Take your time. I'll be here if another urge or thought comes up.",
@@ -136,30 +147,38 @@ async def chat(request: ChatRequest, current_user: dict = Depends(get_current_us
         )
     
     # Step 2: Get user context and history
-    db = get_database()
     user_id = current_user["email"]
     context = await get_user_context(user_id)
     
-    # Fetch last 6 messages (3 turns)
-    history_docs = await db["chat_history"].find({"user_id": user_id}).sort("timestamp", -1).limit(6).to_list(length=6)
-    history = sorted(history_docs, key=lambda x: x['timestamp'])
+    # Fetch last 6 messages (3 turns), including ones not flushed yet
+    history = await chat_history_writer.recent_history(user_id, limit=6)
     
-    # Save user message to history
-    user_msg_doc = {
+    # Save user message to history (written behind, off the request path)
+    chat_history_writer.enqueue({
         "user_id": user_id,
         "role": "user",
         "content": request.message,
         "timestamp": datetime.now().isoformat()
-    }
-    await db["chat_history"].insert_one(user_msg_doc)
+    })
+
+    # Step 3: Serve exact repeats from the response cache (opt-in)
+    cache_key = chat_response_cache.key_for(request.message, context, user_id, bool(history)) if CHAT_CACHE_ENABLED else None
+    if cache_key is not None:
+        cached_response = chat_response_cache.get(cache_key)
+        if cached_response:
+            chat_history_writer.enqueue({
+                "user_id": user_id,
+                "role": "assistant",
+                "content": cached_response,
+                "timestamp": datetime.now().isoformat()
+            })
+            return ChatResponse(response=cached_response, filtered=False)
 
-    # Step 3: Build prompt
+    # Step 4: Build prompt
     prompt = build_prompt(request.message, context, history)
     
-    # Step 4: Call Groq API
+    # Step 5: Call Groq API
     try:
-        from groq import Groq
-        
         api_key = os.getenv("GROQ_API_KEY")
         # print(f"[Chat] Groq API key loaded: {'Yes' if api_key else 'No'}")
         
@@ -169,10 +188,11 @@ async def chat(request: ChatRequest, current_user: dict = Depends(get_current_us
                 filtered=False
             )
         
-        client = Groq(api_key=api_key)
+        client = get_groq_client()
         
         # print(f"[Chat] Sending prompt to Groq...")
-        chat_completion = client.chat.completions.create(
+        chat_completion = await create_chat_completion(
+            client,
             messages=[
                 {
                     "role": "system",
@@ -196,7 +216,6 @@ TONE: Professional, calm, insight-driven, and supportive.
                     "content": prompt
                 }
             ],
-            model="llama-3.1-8b-instant",
             temperature=0.7,
             max_tokens=300
         )
@@ -207,13 +226,14 @@ TONE: Professional, calm, insight-driven, and supportive.
         if response_text:
             cleaned_response = response_text.strip().replace('*', '')
             # Save assistant message to history
-            assistant_msg_doc = {
+            chat_history_writer.enqueue({
                 "user_id": user_id,
                 "role": "assistant",
                 "content": cleaned_response,
                 "timestamp": datetime.now().isoformat()
-            }
-            await db["chat_history"].insert_one(assistant_msg_doc)
+            })
+            if cache_key is not None:
+                chat_response_cache.add(cache_key, cleaned_response)
             
             return ChatResponse(
                 response=cleaned_response,
@@ -225,6 +245,12 @@ TONE: Professional, calm, insight-driven, and supportive.
                 filtered=False
             )
             
+    except LLMOverloaded:
+        # Shed under load: answer instantly instead of queueing behind the provider
+        return ChatResponse(
+            response=random.choice(FALLBACK_RESPONSES['busy']),
+            filtered=False
+        )
     except Exception as e:
         import traceback
         print(f"[Chat] Groq API error: {e}")
@@ -285,8 +311,6 @@ async def get_daily_insight(exclude_index: Optional[int] = None, current_user: d
                 focus_index=-1
             )
         
-        from groq import Groq
-        
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             return DailyInsightResponse(
@@ -295,7 +319,7 @@ async def get_daily_insight(exclude_index: Optional[int] = None, current_user: d
                 focus_index=-1
             )
         
-        client = Groq(api_key=api_key)
+        client = get_groq_client()
         
         # If no logs but we have profile, force focus on preparation/mindset
         if not has_logs and has_profile:
@@ -366,21 +390,31 @@ STRICT RULES:
 
 Insight:"""
 
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a concise wellness assistant. You give 1-2 line insights about smoking patterns. You NEVER mix topics. You ONLY discuss the requested focus area."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            model="llama-3.1-8b-instant",
-            temperature=1.0,
-            max_tokens=80
-        )
+        try:
+            chat_completion = await create_chat_completion(
+                client,
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a concise wellness assistant. You give 1-2 line insights about smoking patterns. You NEVER mix topics. You ONLY discuss the requested focus area."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                temperature=1.0,
+                max_tokens=80
+            )
+        except LLMOverloaded:
+            # Shed under load: answer right away instead of waiting on the LLM
+            days = context['current_smoke_free_days']
+            return DailyInsightResponse(
+                insight=f"{days} smoke-free day{'s' if days != 1 else ''} and counting—keep tracking, every log counts!" if days > 0
+                else "Keep tracking your progress—every log counts toward your smoke-free goals!",
+                has_data=True,
+                focus_index=-1
+            )
         
         insight_text = chat_completion.choices[0].message.content.strip()
         # Clean up any quotes
@@ -409,3 +443,26 @@ Insight:"""
             has_data=True,
             focus_index=-1
         )
+
+@router.get("/history")
+async def get_chat_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Chat messages, newest first. Pass next_cursor back as ?cursor= for the next page.
+    Messages still buffered in the write-behind queue are merged in.
+    """
+    db = get_database()
+    user_id = current_user["email"]
+    page = await keyset_page(
+        db["chat_history"],
+        {"user_id": user_id},
+        sort_field="timestamp",
+        projection={"role": 1, "content": 1},
+        limit=limit,
+        cursor=cursor,
+        pending=chat_history_writer.pending_for(user_id)
+    )
+    return respond(page)
@@ -0,0 +1,79 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime
+from typing import Optional
+from database import get_database
+from oauth2 import get_current_user
+from responses import respond
+from data_version import check_etag, etag_headers
+from routes.calendar_router import build_calendar, compute_lifetime_stats
+from routes.log_router import compute_log_stats
+from routes.urge_router import compute_urge_stats
+from routes.game_router import compute_game_stats
+from routes.insights_router import InsightGraph, save_promoted_goal
+from routes.user_router import settings_from_user
+
+router = APIRouter()
+
+def _insights_or_error(graph: InsightGraph) -> dict:
+    # Same degraded payload as /insights/all so one bad card doesn't fail the whole page
+    try:
+        return graph.build()
+    except Exception as e:
+        print(f"Error in insights: {e}")
+        return {"error": str(e), "has_data": False}
+
+@router.get("")
+async def get_dashboard(year: Optional[int] = None, date: Optional[str] = None, current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
+    """
+    Everything the app needs on load in one round trip: calendar, lifetime,
+    log, urge and game stats, settings and insights.
+    Each collection is read once and every section is computed from those lists.
+    """
+    db = get_database()
+    user_id = current_user["email"]
+    now = datetime.now()
+    year = year or now.year
+    date = date or now.strftime("%Y-%m-%d")
+
+    # The user document is read fresh: the principal from get_current_user is cached
+    user_doc, smoke_logs, urge_logs, game_sessions = await asyncio.gather(
+        db["users"].find_one({"email": user_id}),
+        db["smoke_logs"].find({"user_id": user_id}).sort("date", 1).to_list(length=10000),
+        db["urge_logs"].find({"user_id": user_id}).to_list(length=1000),
+        db["game_sessions"].find({"user_id": user_id}).to_list(length=1000),
+    )
+    if user_doc is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    first_log_date = smoke_logs[0]["date"] if smoke_logs else None
+    year_prefix = f"{year}-"
+    year_logs = [log for log in smoke_logs if log["date"].startswith(year_prefix)]
+
+    insight_graph = InsightGraph(smoke_logs, urge_logs, game_sessions, user_doc)
+
+    # The sections only read the shared lists, so they can run side by side off the event loop
+    calendar, lifetime, insights, log_stats, urge_stats, game_stats = await asyncio.gather(
+        asyncio.to_thread(build_calendar, year, year_logs, first_log_date),
+        asyncio.to_thread(compute_lifetime_stats, smoke_logs),
+        asyncio.to_thread(_insights_or_error, insight_graph),
+        asyncio.to_thread(compute_log_stats, date, smoke_logs),
+        asyncio.to_thread(compute_urge_stats, urge_logs),
+        asyncio.to_thread(compute_game_stats, game_sessions),
+    )
+    await save_promoted_goal(user_id, user_doc, insight_graph.promoted_goal)
+
+    settings = settings_from_user(user_doc)
+    if insight_graph.promoted_goal is not None:
+        # Reflect a goal promotion made while computing insights
+        settings["smoke_free_goal"] = insight_graph.promoted_goal
+
+    return respond({
+        "calendar": calendar,
+        "lifetime": lifetime,
+        "log_stats": log_stats,
+        "urge_stats": urge_stats,
+        "game_stats": game_stats,
+        "settings": settings,
+        "insights": insights,
+    }, headers=etag_headers(etag))
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from database import get_database
+from fastapi import APIRouter, HTTPException, Query
+from database import get_database, insert_stamped
 from models import GameSession, GameStats
 from datetime import datetime
 from typing import Optional
 from fastapi import Depends
 from oauth2 import get_current_user
+from responses import respond
+from data_version import bump_data_version, check_etag, etag_headers
+from pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -17,12 +20,13 @@ async def save_game_session(session: GameSession, current_user: dict = Depends(g
     session_data = session.dict()
     session_data["user_id"] = current_user["email"]
     
-    await game_sessions_collection.insert_one(session_data)
+    await insert_stamped(game_sessions_collection, session_data)
+    await bump_data_version(current_user["email"])
     return {"message": "Game session saved successfully"}
 
 @router.get("/stats", response_model=GameStats)
 @router.get("/stats", response_model=GameStats)
-async def get_game_stats(year: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+async def get_game_stats(year: Optional[int] = None, current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
     db = get_database()
     game_sessions_collection = db["game_sessions"]
     
@@ -34,6 +38,9 @@ async def get_game_stats(year: Optional[int] = None, current_user: dict = Depend
     cursor = game_sessions_collection.find(query)
     sessions = await cursor.to_list(length=1000)
     
+    return respond(compute_game_stats(sessions), headers=etag_headers(etag))
+
+def compute_game_stats(sessions: list) -> dict:
     total_points = sum(s.get("points_earned", 0) for s in sessions)
     max_seconds_focused = max((s.get("seconds_focused", 0) for s in sessions), default=0)
     
@@ -41,3 +48,22 @@ async def get_game_stats(year: Optional[int] = None, current_user: dict = Depend
         "total_points": total_points,
         "max_seconds_focused": max_seconds_focused
     }
+
+@router.get("/history")
+async def get_game_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    etag: str = Depends(check_etag)
+):
+    """Game sessions, newest first. Pass next_cursor back as ?cursor= for the next page."""
+    db = get_database()
+    page = await keyset_page(
+        db["game_sessions"],
+        {"user_id": current_user["email"]},
+        sort_field="timestamp",
+        projection={"seconds_focused": 1, "points_earned": 1},
+        limit=limit,
+        cursor=cursor
+    )
+    return respond(page, headers=etag_headers(etag))
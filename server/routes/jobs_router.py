@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Depends
+from oauth2 import get_current_user
+from responses import respond
+from job_queue import get_job
+
+router = APIRouter()
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status of a background job started by one of the user's requests."""
+    job = await get_job(job_id, current_user["email"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return respond({
+        "id": str(job["_id"]),
+        "type": job["type"],
+        "status": job["status"],
+        "progress": job.get("progress"),
+        "attempts": job.get("attempts", 0),
+        "error": job.get("last_error"),
+        "result": job.get("result"),
+        "created_at": job.get("created_at"),
+        "finished_at": job.get("finished_at"),
+    })
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from database import get_database
+from fastapi import APIRouter, HTTPException, Query
+from database import get_database, insert_stamped
 from models import SmokeLog
 from datetime import datetime
+from typing import Optional
 from fastapi import Depends
 from oauth2 import get_current_user
+from responses import respond
+from data_version import bump_data_version, check_etag, etag_headers
+from pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -19,22 +23,27 @@ async def save_log(log: SmokeLog, current_user: dict = Depends(get_current_user)
         "date": log.date
     })
 
+    # Keeps the user's first_log_date current for the calendar views
+    await db["users"].update_one({"email": user_id}, {"$min": {"first_log_date": log.date}})
+
     if existing_log:
         # Update existing log
         await logs_collection.update_one(
             {"_id": existing_log["_id"]},
             {"$set": {"cigarettes": log.cigarettes, "triggers": log.triggers}}
         )
+        await bump_data_version(user_id)
         return {"message": "Log updated successfully"}
     else:
         # Insert new log
         log_data = log.dict()
         log_data["user_id"] = user_id
-        await logs_collection.insert_one(log_data)
+        await insert_stamped(logs_collection, log_data)
+        await bump_data_version(user_id)
         return {"message": "Log created successfully"}
 
 @router.get("/stats")
-async def get_log_stats(date: str = None, current_user: dict = Depends(get_current_user)):
+async def get_log_stats(date: str = None, current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
     db = get_database()
     logs_collection = db["smoke_logs"]
 
@@ -52,7 +61,13 @@ async def get_log_stats(date: str = None, current_user: dict = Depends(get_curre
     }).sort("date", -1).limit(1)
     
     last_logs = await last_log_cursor.to_list(length=1)
-    last_log = last_logs[0] if last_logs else None
+
+    return respond(compute_log_stats(date, [today_log] + last_logs if today_log else last_logs), headers=etag_headers(etag))
+
+def compute_log_stats(date: str, logs: list) -> dict:
+    """Compare the log for `date` with the latest earlier log, picked from `logs`."""
+    today_log = next((log for log in logs if log["date"] == date), None)
+    last_log = max((log for log in logs if log["date"] < date), key=lambda log: log["date"], default=None)
 
     today_count = today_log["cigarettes"] if today_log else 0
     last_log_count = last_log["cigarettes"] if last_log else 0
@@ -80,3 +95,22 @@ async def get_log_stats(date: str = None, current_user: dict = Depends(get_curre
         "has_logged_today": today_log is not None,
         "today_triggers": today_log.get("triggers", []) if today_log else []
     }
+
+@router.get("/history")
+async def get_log_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    etag: str = Depends(check_etag)
+):
+    """Daily logs, newest first. Pass next_cursor back as ?cursor= for the next page."""
+    db = get_database()
+    page = await keyset_page(
+        db["smoke_logs"],
+        {"user_id": current_user["email"]},
+        sort_field="date",
+        projection={"date": 1, "cigarettes": 1, "triggers": 1},
+        limit=limit,
+        cursor=cursor
+    )
+    return respond(page, headers=etag_headers(etag))
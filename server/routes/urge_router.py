@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from database import get_database
+from fastapi import APIRouter, HTTPException, Query
+from database import get_database, insert_stamped
 from models import UrgeLog, UrgeStats
 from datetime import datetime
 from typing import Optional
 from fastapi import Depends
 from oauth2 import get_current_user
+from responses import respond
+from data_version import bump_data_version, check_etag, etag_headers
+from pagination import keyset_page, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter()
 
@@ -17,11 +20,12 @@ async def save_urge_log(log: UrgeLog, current_user: dict = Depends(get_current_u
     log_dict = log.dict()
     log_dict["user_id"] = current_user["email"]
     
-    await urge_logs_collection.insert_one(log_dict)
+    await insert_stamped(urge_logs_collection, log_dict)
+    await bump_data_version(current_user["email"])
     return {"message": "Urge log saved successfully"}
 
 @router.get("/stats", response_model=UrgeStats)
-async def get_urge_stats(year: Optional[int] = None, current_user: dict = Depends(get_current_user)):
+async def get_urge_stats(year: Optional[int] = None, current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
     db = get_database()
     urge_logs_collection = db["urge_logs"]
     
@@ -33,6 +37,9 @@ async def get_urge_stats(year: Optional[int] = None, current_user: dict = Depend
     cursor = urge_logs_collection.find(query)
     logs = await cursor.to_list(length=1000)
     
+    return respond(compute_urge_stats(logs), headers=etag_headers(etag))
+
+def compute_urge_stats(logs: list) -> dict:
     unique_days = set()
     trigger_counts = {}
     total_urges = len(logs)
@@ -54,3 +61,22 @@ async def get_urge_stats(year: Optional[int] = None, current_user: dict = Depend
         "total_urges": total_urges,
         "total_days": len(unique_days)
     }
+
+@router.get("/history")
+async def get_urge_history(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user),
+    etag: str = Depends(check_etag)
+):
+    """Urge logs, newest first. Pass next_cursor back as ?cursor= for the next page."""
+    db = get_database()
+    page = await keyset_page(
+        db["urge_logs"],
+        {"user_id": current_user["email"]},
+        sort_field="timestamp",
+        projection={"trigger": 1},
+        limit=limit,
+        cursor=cursor
+    )
+    return respond(page, headers=etag_headers(etag))
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from pymongo import ReturnDocument
 from database import get_database
 from pydantic import BaseModel
-from oauth2 import get_current_user
+from oauth2 import get_current_user, invalidate_user
 from typing import Optional
 from models import UserProfile
+from chat_history_writer import chat_history_writer
+from notification_service import update_notification_schedule
+from responses import respond
+from data_version import bump_data_version, check_etag, etag_headers
+from data_export import stream_ndjson, stream_csv_zip
+from job_queue import job_handler, enqueue_job
 
 router = APIRouter()
 
@@ -38,6 +47,7 @@ async def save_onboarding_profile(profile: UserProfile, current_user: dict = Dep
         {"email": current_user["email"]},
         {"$set": {"user_profile": profile.dict()}}
     )
+    await invalidate_user(current_user["email"])
     
     return {"status": "success", "message": "Profile saved", "summary": summary_text}
 
@@ -58,14 +68,19 @@ async def save_user_goal(goal: UserGoal, current_user: dict = Depends(get_curren
         }},
         upsert=True
     )
+    await invalidate_user(current_user["email"])
+    await bump_data_version(current_user["email"])
     return {"status": "success", "goal": goal.smoke_free_goal}
 
 @router.get("/settings") # Removed {user_id}
-async def get_user_settings(current_user: dict = Depends(get_current_user)):
+async def get_user_settings(current_user: dict = Depends(get_current_user), etag: str = Depends(check_etag)):
     db = get_database()
     users_collection = db["users"]
     
     user = await users_collection.find_one({"email": current_user["email"]})
+    return respond(settings_from_user(user), headers=etag_headers(etag))
+
+def settings_from_user(user: Optional[dict]) -> dict:
     if not user:
         return {"smoke_free_goal": 7} # Default to 1 week
     
@@ -95,6 +110,7 @@ async def update_user_profile(profile: UserProfileUpdate, current_user: dict = D
         {"email": current_user["email"]}, # Strict security
         {"$set": {"name": profile.name}}
     )
+    await invalidate_user(current_user["email"])
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
@@ -117,53 +133,117 @@ async def update_user_settings(settings: UserCostUpdate, current_user: dict = De
             "currency": settings.currency
         }}
     )
+    await invalidate_user(current_user["email"])
+    await bump_data_version(current_user["email"])
     return {"status": "success"}
 
-@router.delete("/data")
+@router.get("/export")
+async def export_user_data(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), current_user: dict = Depends(get_current_user)):
+    """
+    Download everything stored for the user, streamed straight from the database.
+    format=ndjson: one JSON record per line. format=csv: a zip of CSV files.
+    """
+    user_id = current_user["email"]
+    # Write out buffered chat messages so the export includes them
+    await chat_history_writer.flush()
+
+    stamp = datetime.now().strftime("%Y%m%d")
+    if format == "csv":
+        body, media_type, filename = stream_csv_zip(user_id), "application/zip", f"respira-export-{stamp}.zip"
+    else:
+        body, media_type, filename = stream_ndjson(user_id), "application/x-ndjson", f"respira-export-{stamp}.ndjson"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# Activity collections removed by the purge job
+PURGED_COLLECTIONS = ["smoke_logs", "game_sessions", "urge_logs", "chat_history"]
+
+@job_handler("purge_user_data")
+async def purge_user_data(payload: dict, report):
+    """
+    Deletes the user's activity as of the request. Activity documents carry a
+    created_at stamped by the database server, and `requested_at` comes from
+    the same clock, so anything written after the request survives a late run
+    or a retry. Documents from before created_at existed are always deleted.
+    """
+    db = get_database()
+    user_id = payload["user_id"]
+    written_before = {"$or": [
+        {"created_at": {"$lte": payload["requested_at"]}},
+        {"created_at": {"$exists": False}}
+    ]}
+    for done, collection in enumerate(PURGED_COLLECTIONS):
+        await report(done, len(PURGED_COLLECTIONS))
+        await db[collection].delete_many({"user_id": user_id, **written_before})
+    await report(len(PURGED_COLLECTIONS), len(PURGED_COLLECTIONS))
+
+    # No-ops when the account itself was deleted
+    await db["users"].update_one({"email": user_id}, {"$unset": {"first_log_date": "", "purge_requested_at": ""}})
+    await bump_data_version(user_id)
+    return {"collections": PURGED_COLLECTIONS}
+
+async def _stamp_purge_request(db, user_id: str):
+    """The database server's time for this request (the purge cutoff), or None if the user is gone."""
+    user = await db["users"].find_one_and_update(
+        {"email": user_id},
+        {"$currentDate": {"purge_requested_at": True}},
+        projection={"purge_requested_at": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return user["purge_requested_at"] if user else None
+
+@router.delete("/data", status_code=202)
 async def delete_all_data(current_user: dict = Depends(get_current_user)):
     """
     Delete all user activity data while preserving the account and questionnaire answers.
     Preserves: email, name, password, user_profile, smoke_free_goal, cigarette_cost, currency
     Deletes: smoke_logs, game_sessions, urge_logs, chat_history
+    The deletes run as a background job; poll GET /jobs/{job_id} for completion.
     """
     db = get_database()
     user_id = current_user["email"]
-    
-    # Delete all activity data from various collections
-    await db["smoke_logs"].delete_many({"user_id": user_id})
-    await db["game_sessions"].delete_many({"user_id": user_id})
-    await db["urge_logs"].delete_many({"user_id": user_id})
-    await db["chat_history"].delete_many({"user_id": user_id})
-    
+    requested_at = await _stamp_purge_request(db, user_id)
+    if requested_at is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    chat_history_writer.discard(user_id)
+    job_id = await enqueue_job("purge_user_data", {"user_id": user_id, "requested_at": requested_at}, user_id)
+
     return {
-        "status": "success",
-        "message": "All activity data has been deleted. Your account and questionnaire answers remain intact."
+        "status": "accepted",
+        "job_id": job_id,
+        "message": "Your activity data is being deleted. Your account and questionnaire answers remain intact."
     }
 
-@router.delete("/account")
+@router.delete("/account", status_code=202)
 async def delete_account(current_user: dict = Depends(get_current_user)):
     """
     Completely delete the user account and all associated data.
-    This action is irreversible.
+    This action is irreversible. The account is removed right away;
+    its activity data is purged by a background job.
     """
     db = get_database()
     user_id = current_user["email"]
     
-    # Delete all data from all collections
-    await db["smoke_logs"].delete_many({"user_id": user_id})
-    await db["game_sessions"].delete_many({"user_id": user_id})
-    await db["urge_logs"].delete_many({"user_id": user_id})
-    await db["chat_history"].delete_many({"user_id": user_id})
-    
+    requested_at = await _stamp_purge_request(db, user_id)
+
     # Delete the user account itself
     result = await db["users"].delete_one({"email": user_id})
+    await invalidate_user(user_id)
     
-    if result.deleted_count == 0:
+    if requested_at is None or result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+
+    chat_history_writer.discard(user_id)
+    job_id = await enqueue_job("purge_user_data", {"user_id": user_id, "requested_at": requested_at}, user_id)
     
     return {
-        "status": "success",
-        "message": "Your account and all associated data have been permanently deleted."
+        "status": "accepted",
+        "job_id": job_id,
+        "message": "Your account has been permanently deleted. Its remaining data is being removed."
     }
 
 @router.put("/notifications")
@@ -175,6 +255,9 @@ async def update_notifications(data: UserNotificationsUpdate, current_user: dict
         {"email": current_user["email"]},
         {"$set": {"notifications_enabled": data.enabled}}
     )
+    await invalidate_user(current_user["email"])
+    await bump_data_version(current_user["email"])
+    await update_notification_schedule(current_user["email"], data.enabled)
     return {"status": "success", "notifications_enabled": data.enabled}
 
 @router.post("/test-notification")
@@ -187,7 +270,7 @@ async def test_notification(current_user: dict = Depends(get_current_user)):
     
     email = current_user["email"]
     insight = await generate_insight_for_user(email)
-    send_daily_insight_email(email, insight)
+    await send_daily_insight_email(email, insight)
     
     return {
         "status": "success", 